@@ -0,0 +1,249 @@
+"""Benchmark the whole transcription pipeline against a local stub of the API.
+
+Each scenario generates a synthetic recording (a warbling tone over pink
+noise, with a stretch of silence every minute) of a given length and format,
+starts a ``StubGroqServer`` with the scenario's latency and error rates, and
+transcribes and summarizes the recording with a cold cache in a fresh
+process. Wall time, CPU time (the Python process and its ffmpeg children),
+peak RSS and the requests the server saw are recorded per scenario.
+
+Results are written as JSON and compared against a baseline from an earlier
+run of the same scenario at the same length; a measurement that grew by more
+than ``--tolerance`` is reported as a regression.
+
+    python benchmarks/bench_pipeline.py --save-baseline
+    python benchmarks/bench_pipeline.py --only long-mp3 long-wav --fail-on-regression
+    python benchmarks/bench_pipeline.py --scale 0.2
+
+Needs ffmpeg and ffprobe; no API key is used and nothing leaves the machine.
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from transcriber.audio_stream import FFMPEG  # noqa: E402
+from transcriber.backends import GroqBackend  # noqa: E402
+from transcriber.engine import TranscriptionEngine, TranscriptionSettings  # noqa: E402
+from transcriber.fakes import StubGroqServer  # noqa: E402
+from transcriber.http_pool import make_groq_client  # noqa: E402
+from transcriber.scheduler import RateLimits, RequestScheduler, ScheduledChatClient  # noqa: E402
+from transcriber.transcription_cache import TranscriptionCache  # noqa: E402
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# Relative increase of a measurement that counts as a regression
+DEFAULT_TOLERANCE = 0.10
+# Measurements compared against the baseline; lower is better for all of them
+COMPARED = ("wall_seconds", "cpu_seconds", "peak_rss_mb", "requests")
+
+# ffmpeg encoder arguments and file extension per format
+FORMATS = {
+    "mp3-128k": (["-c:a", "libmp3lame", "-b:a", "128k"], "mp3"),
+    "m4a-96k": (["-c:a", "aac", "-b:a", "96k"], "m4a"),
+    "opus-32k": (["-c:a", "libopus", "-b:a", "32k"], "ogg"),
+    "flac": (["-c:a", "flac"], "flac"),
+    "wav": (["-c:a", "pcm_s16le"], "wav"),
+}
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str
+    minutes: float
+    format: str
+    # Stub server behaviour
+    latency: float = 0.2
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    # TranscriptionSettings fields
+    settings: dict = field(default_factory=dict)
+
+
+SCENARIOS = [
+    Scenario("short-mp3", 2, "mp3-128k"),
+    Scenario("long-mp3", 40, "mp3-128k", latency=0.5),
+    Scenario("long-m4a", 40, "m4a-96k", latency=0.5),
+    Scenario("long-opus", 60, "opus-32k", latency=0.5),
+    Scenario("long-wav", 20, "wav", latency=0.5, settings={"downsample": False}),
+    Scenario("long-flac-vad", 30, "flac", latency=0.5, settings={"downsample": True, "skip_non_speech": True}),
+    Scenario("flaky-api", 40, "mp3-128k", latency=0.5, error_rate=0.1, rate_limit_rate=0.05),
+]
+
+
+def make_recording(path, minutes, encoder_args):
+    """A reproducible speech-like signal in stereo at 44.1 kHz, silent for 15 s of every minute."""
+    seconds = minutes * 60
+    subprocess.run([
+        FFMPEG, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+        "-f", "lavfi", "-i", f"sine=frequency=220:beep_factor=4:duration={seconds}",
+        "-f", "lavfi", "-i", f"anoisesrc=color=pink:amplitude=0.05:seed=1:duration={seconds}",
+        "-filter_complex",
+        "amix=inputs=2,volume=enable='between(mod(t,60),40,55)':volume=0,"
+        "aformat=sample_rates=44100:channel_layouts=stereo",
+        *encoder_args, path,
+    ], check=True)
+
+
+def run_scenario(source, settings_fields, workdir):
+    """Transcribe ``source`` with a cold cache; runs in the child process and returns its measurements."""
+    # Rate limits are not what is being measured, but retries are
+    scheduler = RequestScheduler(
+        os.path.join(workdir, "rate_limits.sqlite3"), limits={}, default_limits=RateLimits(),
+        base_delay=0.05, max_delay=0.5,
+    )
+    client = make_groq_client(api_key="benchmark")
+    engine = TranscriptionEngine(
+        GroqBackend(client, scheduler),
+        ScheduledChatClient(client, scheduler),
+        TranscriptionCache(os.path.join(workdir, "cache.sqlite3")),
+    )
+    settings = TranscriptionSettings(**settings_fields)
+
+    started = time.perf_counter()
+    result = engine.transcribe_file(source, os.path.basename(source), settings)
+    wall_seconds = time.perf_counter() - started
+
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in kilobytes on Linux
+    return {
+        "wall_seconds": wall_seconds,
+        "cpu_seconds": own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime,
+        "python_cpu_seconds": own.ru_utime + own.ru_stime,
+        "peak_rss_mb": own.ru_maxrss / 1024,
+        "ffmpeg_peak_rss_mb": children.ru_maxrss / 1024,
+        "chunks": result.chunk_count,
+        "chunk_errors": len(result.chunk_errors),
+        "bytes_uploaded": result.metrics["counters"].get("bytes_uploaded", 0),
+        "stages": {stage: span["seconds"] for stage, span in result.metrics["spans"].items()},
+    }
+
+
+def measure(scenario, workdir):
+    """Generate the scenario's recording and run it in a fresh process against its own stub server."""
+    encoder_args, extension = FORMATS[scenario.format]
+    # A directory of its own, so every scenario starts with an empty cache
+    workdir = tempfile.mkdtemp(dir=workdir)
+    source = os.path.join(workdir, f"{scenario.name}.{extension}")
+    try:
+        make_recording(source, scenario.minutes, encoder_args)
+        server = StubGroqServer(
+            latency=scenario.latency, rate_limit_rate=scenario.rate_limit_rate, retry_after=0.1,
+            error_rate=scenario.error_rate, seed=1,
+        )
+        with server:
+            child = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", source, json.dumps(scenario.settings),
+                 workdir],
+                env=dict(os.environ, GROQ_BASE_URL=server.base_url),
+                capture_output=True, text=True,
+            )
+        if child.returncode != 0:
+            raise RuntimeError(f"scenario {scenario.name} failed:\n{child.stderr}")
+        measurements = json.loads(child.stdout.splitlines()[-1])
+        measurements["requests"] = len(server.requests)
+        measurements["failed_requests"] = sum(status != 200 for _, status in server.requests)
+        measurements["source_mb"] = os.path.getsize(source) / 2**20
+        return measurements
+    finally:
+        shutil.rmtree(workdir)
+
+
+def compare(results, baseline, tolerance):
+    """Lines describing each measurement against the baseline, and the names of the regressions."""
+    lines, regressions = [], []
+    for name, measurements in results.items():
+        if name not in baseline:
+            lines.append(f"{name:<16} (not in the baseline)")
+            continue
+        if baseline[name].get("minutes") != measurements.get("minutes"):
+            lines.append(f"{name:<16} (the baseline used a {baseline[name].get('minutes')} minute recording)")
+            continue
+        changes = []
+        for key in COMPARED:
+            before, after = baseline[name].get(key), measurements.get(key)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            flag = ""
+            if change > tolerance:
+                flag = " !"
+                regressions.append(f"{name} {key}")
+            changes.append(f"{key} {before:.1f} -> {after:.1f} ({change:+.0%}){flag}")
+        lines.append(f"{name:<16} " + ", ".join(changes))
+    return lines, regressions
+
+
+def main():
+    if len(sys.argv) == 5 and sys.argv[1] == "--child":
+        _, _, source, settings_json, workdir = sys.argv
+        print(json.dumps(run_scenario(source, json.loads(settings_json), workdir)))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", nargs="+", choices=[scenario.name for scenario in SCENARIOS],
+                        help="run only these scenarios")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every recording's length by this")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="relative increase that counts as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    scenarios = [scenario for scenario in SCENARIOS if not args.only or scenario.name in args.only]
+    results = {}
+    print(f"{'scenario':<16} {'audio min':>9} {'MB':>7} {'wall s':>8} {'CPU s':>8} {'RSS MB':>8} "
+          f"{'requests':>9} {'failed':>7} {'chunks':>7}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for scenario in scenarios:
+            scenario = Scenario(**{**asdict(scenario), "minutes": scenario.minutes * args.scale})
+            measurements = measure(scenario, workdir)
+            measurements["minutes"] = scenario.minutes
+            results[scenario.name] = measurements
+            print(f"{scenario.name:<16} {scenario.minutes:>9.1f} {measurements['source_mb']:>7.1f} "
+                  f"{measurements['wall_seconds']:>8.1f} {measurements['cpu_seconds']:>8.1f} "
+                  f"{measurements['peak_rss_mb']:>8.0f} {measurements['requests']:>9} "
+                  f"{measurements['failed_requests']:>7} {measurements['chunks']:>7}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.baseline}:")
+        lines, regressions = compare(results, baseline, args.tolerance)
+        print("\n".join(lines))
+    elif not args.save_baseline:
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to store one")
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+        # Scenarios that were not run keep their old baseline
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+
+    if regressions and args.fail_on_regression:
+        print(f"{len(regressions)} regressions: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
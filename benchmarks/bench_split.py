@@ -0,0 +1,86 @@
+"""Compare the CPU cost of cutting chunks by stream copy versus transcoding.
+
+Generates a synthetic recording per source format, cuts it into chunks with
+``export_window`` using both the transcoding path (AAC, as every chunk used
+to be exported) and the stream-copy path, and reports ffmpeg CPU time per
+hour of audio. Only ffmpeg is needed; no API calls are made.
+
+    python benchmarks/bench_split.py --minutes 30
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from transcriber.audio_stream import FFMPEG, ChunkEncoding, export_window, fixed_spans  # noqa: E402
+from transcriber.chunk_sizing import COPYABLE_CODECS  # noqa: E402
+
+# (label, ffmpeg encoder arguments, file extension, codec name as ffprobe reports it)
+SOURCES = [
+    ("mp3 128k", ["-c:a", "libmp3lame", "-b:a", "128k"], "mp3", "mp3"),
+    ("m4a 96k", ["-c:a", "aac", "-b:a", "96k"], "m4a", "aac"),
+    ("ogg/opus 48k", ["-c:a", "libopus", "-b:a", "48k"], "ogg", "opus"),
+    ("flac", ["-c:a", "flac"], "flac", "flac"),
+]
+
+
+def make_source(path, minutes, encoder_args):
+    """A speech-like test signal: a warbling tone over pink noise, in stereo at 44.1 kHz."""
+    subprocess.run([
+        FFMPEG, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+        "-f", "lavfi", "-i", f"sine=frequency=220:beep_factor=4:duration={minutes * 60}",
+        "-f", "lavfi", "-i", f"anoisesrc=color=pink:amplitude=0.05:duration={minutes * 60}",
+        "-filter_complex", "amix=inputs=2,aformat=sample_rates=44100:channel_layouts=stereo",
+        *encoder_args, path,
+    ], check=True)
+
+
+def children_cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def time_export(path, spans, encoding, workdir):
+    cpu_before = children_cpu_seconds()
+    wall_before = time.perf_counter()
+    total_bytes = 0
+    for i, (start_ms, end_ms) in enumerate(spans):
+        out_path = os.path.join(workdir, f"chunk_{i}.{encoding.extension}")
+        export_window(path, start_ms, end_ms, out_path, encoding)
+        total_bytes += os.path.getsize(out_path)
+        os.remove(out_path)
+    return children_cpu_seconds() - cpu_before, time.perf_counter() - wall_before, total_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--minutes", type=int, default=30, help="length of each synthetic recording")
+    parser.add_argument("--chunk-minutes", type=int, default=10)
+    args = parser.parse_args()
+
+    hours = args.minutes / 60
+    spans = fixed_spans(args.minutes * 60 * 1000, args.chunk_minutes * 60 * 1000)
+    print(f"{'source':<14} {'path':<10} {'CPU s/audio h':>14} {'wall s':>8} {'MB out':>8}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for label, encoder_args, extension, codec in SOURCES:
+            source = os.path.join(workdir, f"source.{extension}")
+            make_source(source, args.minutes, encoder_args)
+
+            muxer, chunk_extension = COPYABLE_CODECS[codec]
+            paths = [
+                ("transcode", ChunkEncoding()),
+                ("copy", ChunkEncoding(codec="copy", muxer=muxer, extension=chunk_extension)),
+            ]
+            for name, encoding in paths:
+                cpu, wall, size = time_export(source, spans, encoding, workdir)
+                print(f"{label:<14} {name:<10} {cpu / hours:>14.1f} {wall:>8.1f} {size / 2**20:>8.1f}")
+            os.remove(source)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Offline checks of chunk dispatch, rate-limit retries and resuming, against the fakes in ``transcriber.fakes``.
+
+Resuming needs ffmpeg to cut the chunks; nothing reaches the real API.
+"""
+import shutil
+import subprocess
+import time
+
+import groq
+import pytest
+
+from transcriber.audio_stream import FFMPEG
+from transcriber.backends import GroqBackend
+from transcriber.chunk_dispatch import dispatch_chunks
+from transcriber.engine import TranscriptionEngine, TranscriptionSettings
+from transcriber.fakes import FakeGroq, StubGroqServer
+from transcriber.metrics import Metrics
+from transcriber.scheduler import RequestScheduler
+from transcriber.transcription_cache import TranscriptionCache
+
+requires_ffmpeg = pytest.mark.skipif(shutil.which(FFMPEG) is None, reason="needs ffmpeg")
+
+
+def test_results_keep_chunk_order_when_a_chunk_fails():
+    # Jitter makes the chunks finish out of order; whichever request comes in second fails
+    client = FakeGroq(latency=0.01, jitter=0.05, fail_calls={1})
+
+    def transcribe_chunk(index, chunk):
+        return client.audio.transcriptions.create(file=(chunk, b"audio"), model="whisper").text
+
+    chunks = [f"chunk{i}" for i in range(8)]
+    results = dispatch_chunks(chunks, transcribe_chunk, max_workers=4)
+
+    assert [result.index for result in results] == list(range(8))
+    assert len([result for result in results if not result.ok]) == 1
+    for result in results:
+        if result.ok:
+            assert result.text.startswith(f"[chunk{result.index}:")
+
+
+def test_scheduler_waits_as_long_as_retry_after_asks(tmp_path):
+    scheduler = RequestScheduler(path=str(tmp_path / "rate_limits.sqlite3"))
+    metrics = Metrics()
+    with StubGroqServer(rate_limit_first=1, retry_after=1.0) as server:
+        client = groq.Groq(api_key="stub", base_url=server.base_url, max_retries=0)
+        started = time.perf_counter()
+        reply = scheduler.call(
+            lambda: client.chat.completions.create(model="llama", messages=[{"role": "user", "content": "hi"}]),
+            "llama", metrics=metrics,
+        )
+        elapsed = time.perf_counter() - started
+
+    assert reply.choices[0].message.content
+    assert [status for _, status in server.requests] == [429, 200]
+    assert elapsed >= 1.0
+    counters = metrics.snapshot()["counters"]
+    assert counters["rate_limited_requests"] == 1
+    assert counters["rate_limit_wait_seconds"] >= 1.0
+
+
+@requires_ffmpeg
+def test_resume_only_sends_the_missing_chunk(tmp_path):
+    # 200 s of 128 kbps audio comes to four chunks under a 1 MB limit
+    path = str(tmp_path / "tone.wav")
+    subprocess.run([
+        FFMPEG, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+        "-f", "lavfi", "-i", "sine=frequency=220:duration=200", "-ac", "1", "-ar", "8000", path,
+    ], check=True)
+    probe = {
+        "duration_ms": 200000, "format_name": "wav", "codec_name": "pcm_s16le", "bit_rate": 128000,
+        "sample_rate": 8000, "channels": 1,
+    }
+    settings = TranscriptionSettings(threshold_mb=1, trim_silence=False, max_concurrent_chunks=1)
+    cache = TranscriptionCache(str(tmp_path / "cache.sqlite3"))
+
+    failing = FakeGroq(fail_calls={1})
+    first = TranscriptionEngine(GroqBackend(failing), failing, cache).transcribe_file(
+        path, "tone.wav", settings, probe=probe,
+    )
+    assert first.chunk_count > 2
+    assert len(first.chunk_errors) == 1
+
+    client = FakeGroq()
+    second = TranscriptionEngine(GroqBackend(client), client, cache).transcribe_file(
+        path, "tone.wav", settings, probe=probe,
+    )
+    assert second.complete
+    assert second.reused_chunks == first.chunk_count - 1
+    assert [call["name"] for call in client.audio.transcriptions.calls] == ["tone.wav_chunk2.m4a"]
@@ -0,0 +1,5 @@
+"""Command-line batch transcription; see ``transcriber.batch``."""
+from transcriber.batch import main
+
+if __name__ == "__main__":
+    main()
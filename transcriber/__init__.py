@@ -0,0 +1,36 @@
+"""Transcription engine shared by the Streamlit pages, the job workers and the batch CLI.
+
+Build a ``TranscriptionEngine`` from a speech-to-text backend, a chat client
+for summaries and a ``TranscriptionCache``, pick a ``ModelProfile`` and call
+``transcribe_file``::
+
+    engine = TranscriptionEngine(GroqBackend(client), client, TranscriptionCache())
+    settings = TranscriptionSettings.from_profile(TURBO, language="Dutch", language_code="nl")
+    result = engine.transcribe_file("meeting.mp3", "meeting.mp3", settings)
+
+The Streamlit page lives in ``transcriber.app`` and is not imported here, so
+the engine can be used without Streamlit installed.
+"""
+from .backends import GroqBackend
+from .engine import LANGUAGE_CODES, TranscriptionEngine, TranscriptionResult, TranscriptionSettings
+from .profiles import DEFAULT_PROFILE, LARGE_V3, PROFILES, TRANSLATE_TO_ENGLISH, TURBO, ModelProfile
+from .timestamps import Segment, to_srt, to_vtt
+from .transcription_cache import TranscriptionCache
+
+__all__ = [
+    "DEFAULT_PROFILE",
+    "LANGUAGE_CODES",
+    "LARGE_V3",
+    "PROFILES",
+    "TRANSLATE_TO_ENGLISH",
+    "TURBO",
+    "GroqBackend",
+    "ModelProfile",
+    "Segment",
+    "TranscriptionCache",
+    "TranscriptionEngine",
+    "TranscriptionResult",
+    "TranscriptionSettings",
+    "to_srt",
+    "to_vtt",
+]
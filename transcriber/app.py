@@ -0,0 +1,367 @@
+"""The Streamlit page shared by every transcription script.
+
+``run_app(profile)`` draws the login, upload form and job view; the
+``transcribe_st*.py`` scripts only choose a ``ModelProfile``. Transcription
+itself runs in the job workers, so this module only submits and polls.
+"""
+import os
+
+import streamlit as st
+import streamlit_authenticator as stauth
+import yaml
+from yaml.loader import SafeLoader
+
+from .backends import LocalWhisperSettings
+from .chunk_dispatch import DEFAULT_MAX_WORKERS
+from .chunk_plan import format_timestamp
+from .engine import LANGUAGE_CODES, TranscriptionSettings
+from .jobs import (
+    DEFAULT_JOBS_DIR,
+    DEFAULT_JOBS_PER_WORKER,
+    DONE,
+    FAILED,
+    PARTIAL,
+    QUEUED,
+    RUNNING,
+    JobStore,
+    start_workers,
+)
+from .http_pool import PoolSettings
+from .metrics import PROCESS_METRICS, audio_seconds_per_second
+from .profiles import TRANSLATE
+from .scheduler import DEFAULT_SCHEDULER_PATH
+from .timestamps import to_jsonl, to_srt, to_vtt
+from .transcription_cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_BYTES, TranscriptionCache
+
+# How often a running job is polled for progress, in seconds
+JOB_POLL_SECONDS = 2
+
+
+def run_app(profile):
+    """Run the page with the models and task of ``profile``."""
+    # Setting the Streamlit app title and page configuration
+    st.set_page_config(
+        page_title=profile.title,
+        page_icon="🎧",
+        layout="centered"
+    )
+
+    # Sidebar with information about the app
+    with st.sidebar:
+        st.title("About this App")
+        st.info("""
+        **Audio Transcription App**
+
+        - This app transcribes uploaded audio files to text using the current fastest transcription methods and state-of-the-art large language models.
+        - Supports multiple audio formats: WAV, MP3, M4A, OGG, FLAC.
+        """)
+
+    # Loading the configuration file for authentication
+    with open('config.yaml') as file:
+        config = yaml.load(file, Loader=SafeLoader)
+
+    # Initializing the authenticator
+    authenticator = stauth.Authenticate(
+        config['credentials'],
+        config['cookie']['name'],
+        config['cookie']['key'],
+        config['cookie']['expiry_days'],
+    )
+
+    # Creating the login widget
+    try:
+        authenticator.login('main')
+    except Exception as e:
+        st.error(e)
+
+    # Checking the authentication status
+    if st.session_state['authentication_status']:
+        st.title(f"🎤 Welcome, {st.session_state['name']}!")
+        os.environ["GROQ_API_KEY"] = st.secrets["GROQ_API_KEY"]
+
+        # Language selection; translations always come out in English
+        if profile.task == TRANSLATE:
+            selected_language = "English"
+            st.caption("Speech in any language is translated to English.")
+        else:
+            language_options = list(LANGUAGE_CODES)
+            selected_language = st.selectbox(
+                "Select language for transcription and summary", language_options, index=0
+            )
+        selected_language_code = LANGUAGE_CODES[selected_language]
+
+        # The language heard in the first 30 seconds is used for the whole file, with a warning if it
+        # is not the one selected, instead of the file having to be transcribed again after a wrong choice
+        detect_language = profile.task != TRANSLATE and st.checkbox(
+            "Detect the spoken language from the first 30 seconds", value=True
+        )
+
+        # Leave long pauses out of the chunks that are sent for transcription
+        trim_silence = st.checkbox("Skip long silences in large files", value=True)
+
+        # Whisper only hears 16 kHz mono, so anything more is wasted upload
+        downsample = st.checkbox("Downsample large files to 16 kHz mono before uploading", value=True)
+
+        # Only speech is uploaded; silence, noise and dead air are cut out first
+        skip_non_speech = st.checkbox("Remove silence and noise from large files before uploading", value=True)
+
+        # Segments are always timed; timing every word makes the JSON Lines download much larger
+        word_timestamps = st.checkbox("Include word timestamps", value=False)
+
+        # Number of chunks exported and transcribed at the same time
+        max_concurrent_chunks = int(st.secrets.get("MAX_CONCURRENT_CHUNKS", DEFAULT_MAX_WORKERS))
+
+        # Everything that decides what a transcription job produces
+        settings = TranscriptionSettings.from_profile(
+            profile,
+            language=selected_language,
+            language_code=selected_language_code,
+            trim_silence=trim_silence,
+            downsample=downsample,
+            skip_non_speech=skip_non_speech,
+            word_timestamps=word_timestamps,
+            detect_language=detect_language,
+            max_concurrent_chunks=max_concurrent_chunks,
+        )
+
+        @st.cache_resource
+        def get_job_store():
+            return JobStore(st.secrets.get("JOBS_DIR", DEFAULT_JOBS_DIR))
+
+        @st.cache_resource
+        def get_job_workers():
+            # Set START_JOB_WORKERS = false when workers run separately (python -m transcriber.jobs worker)
+            if not st.secrets.get("START_JOB_WORKERS", True):
+                return []
+            return start_workers(
+                int(st.secrets.get("JOB_WORKERS", 2)),
+                st.secrets.get("JOBS_DIR", DEFAULT_JOBS_DIR),
+                st.secrets.get("TRANSCRIPTION_CACHE_PATH", DEFAULT_CACHE_PATH),
+                int(st.secrets.get("TRANSCRIPTION_CACHE_MAX_MB", DEFAULT_MAX_BYTES // (1024 * 1024))) * 1024 * 1024,
+                st.secrets.get("RATE_LIMITS_PATH", DEFAULT_SCHEDULER_PATH),
+                PoolSettings(
+                    max_connections=int(st.secrets.get("HTTP_MAX_CONNECTIONS", PoolSettings.max_connections)),
+                    max_keepalive_connections=int(
+                        st.secrets.get("HTTP_MAX_CONNECTIONS", PoolSettings.max_keepalive_connections)
+                    ),
+                    read_timeout=float(st.secrets.get("HTTP_READ_TIMEOUT", PoolSettings.read_timeout)),
+                ),
+                # Set LOCAL_WHISPER = true to transcribe on this machine with faster-whisper
+                LocalWhisperSettings(
+                    cpu_threads=int(st.secrets.get("LOCAL_WHISPER_THREADS", LocalWhisperSettings.cpu_threads)),
+                    num_workers=max_concurrent_chunks,
+                    batch_size=int(st.secrets.get("LOCAL_WHISPER_BATCH_SIZE", LocalWhisperSettings.batch_size)),
+                ) if st.secrets.get("LOCAL_WHISPER", False) else None,
+                # Each worker serves Prometheus metrics on its own port, starting at METRICS_PORT
+                int(st.secrets["METRICS_PORT"]) if "METRICS_PORT" in st.secrets else None,
+                st.secrets.get("METRICS_LOG"),
+                # Jobs run together in each worker, their chunks sharing MAX_CONCURRENT_CHUNKS slots
+                int(st.secrets.get("JOBS_PER_WORKER", DEFAULT_JOBS_PER_WORKER)),
+                max_concurrent_chunks,
+            )
+
+        # Transcription runs in worker processes; this page only submits jobs and polls them
+        job_store = get_job_store()
+        get_job_workers()
+
+        def render_job(job):
+            """Show a job's progress and whatever results it has so far."""
+            if job["status"] in (QUEUED, RUNNING):
+                st.progress(job["progress"], text=job["message"] or "Waiting for a worker...")
+            elif job["status"] == FAILED:
+                st.error(f"An error occurred while transcribing the file: {job['error']}")
+            elif job["status"] == PARTIAL:
+                st.warning(job["message"])
+            else:
+                st.success(job["message"])
+
+            details = job["details"]
+            if details.get("language_warning"):
+                st.warning(details["language_warning"])
+            if details.get("cached"):
+                st.info("This recording was transcribed before; using the cached transcription.")
+            if details.get("bytes_saved"):
+                source_mb = details["source_bytes"] / (1024 * 1024)
+                uploaded_mb = (details["source_bytes"] - details["bytes_saved"]) / (1024 * 1024)
+                st.info(
+                    f"Downsampling shrank the audio from {source_mb:.1f} MB to {uploaded_mb:.1f} MB "
+                    f"({details['bytes_saved'] / details['source_bytes']:.0%} smaller)."
+                )
+            if details.get("non_speech_ms"):
+                st.info(f"Removed {format_timestamp(details['non_speech_ms'])} of silence and noise before uploading.")
+            if details.get("chunk_plan"):
+                with st.expander(f"Chunk plan ({details['chunk_count']} chunks)"):
+                    st.text(details["chunk_plan"])
+            if details.get("reused_chunks"):
+                st.info(f"Reused {details['reused_chunks']} of {details['chunk_count']} chunks from an earlier run.")
+            # This file's own share of the API waits and connections, even when other files ran alongside it
+            counters = details.get("metrics", {}).get("counters", {})
+            waited = counters.get("rate_limit_wait_seconds", 0)
+            retried = counters.get("retried_requests", 0)
+            if retried or waited >= 1:
+                st.caption(
+                    f"Waited {waited:.0f} s for API rate limits "
+                    f"({counters.get('rate_limited_requests', 0)} rate-limited, {retried} retried requests)."
+                )
+            if details.get("timings"):
+                with st.expander("Pipeline timings"):
+                    st.write({stage: f"{seconds:.1f} s" for stage, seconds in details["timings"].items()})
+                    http_requests = counters.get("http_requests", 0)
+                    if http_requests:
+                        new_connections = counters.get("http_new_connections", 0)
+                        st.caption(
+                            f"{http_requests} HTTP requests on {new_connections} new connections "
+                            f"({max(http_requests - new_connections, 0) / http_requests:.0%} reused, "
+                            f"{counters.get('http_connect_seconds', 0):.2f} s connecting)"
+                        )
+            for chunk_error in details.get("chunk_errors", []):
+                st.error(chunk_error)
+            if details.get("chunk_errors"):
+                st.warning("Transcribe the file again to retry only the chunks that failed.")
+
+            # Detecting the language can change it from the one that was chosen
+            language = details.get("language") or job["settings"]["language"]
+            st.subheader(f"Summary and To-Do List ({language}):")
+            if job["summary"]:
+                st.write(job["summary"])
+            elif job["status"] in (QUEUED, RUNNING):
+                st.caption("The summary appears here while it is being written.")
+            st.subheader(f"Transcription ({language}):")
+            st.write(job["transcript"])
+
+        def render_timings(job):
+            """Sidebar breakdown of where a finished job's time went."""
+            metrics = job["details"].get("metrics")
+            if not metrics:
+                st.caption("Timings appear here when the job is done.")
+                return
+            spans = metrics.get("spans", {})
+            st.write({
+                stage: f"{span['seconds']:.2f} s" + (f" ({span['count']}×)" if span["count"] > 1 else "")
+                for stage, span in sorted(spans.items(), key=lambda item: item[1]["seconds"], reverse=True)
+            })
+            counters = metrics.get("counters", {})
+            speed = audio_seconds_per_second(metrics)
+            if speed is not None:
+                st.caption(f"{counters['audio_seconds']:.0f} s of audio at {speed:.1f} s of audio per second")
+            if counters.get("bytes_uploaded"):
+                st.caption(
+                    f"{counters['bytes_uploaded'] / (1024 * 1024):.1f} MB uploaded in "
+                    f"{counters.get('transcription_requests', 0)} requests"
+                )
+            upload_write = PROCESS_METRICS.snapshot()["spans"].get("upload_write")
+            if upload_write:
+                st.caption(f"Saving uploads on this server: {upload_write['max_seconds']:.2f} s at most")
+
+        def render_downloads(job):
+            """Download buttons for a finished job's transcript, summary and timestamps."""
+            name = os.path.splitext(job["filename"])[0]
+            downloads = [
+                ("Transcript", job["transcript"], f"{name}.transcript.txt", "text/plain"),
+                ("Summary", job["summary"], f"{name}.summary.txt", "text/plain"),
+            ]
+            segments = job_store.get_segments(job["id"])
+            if segments:
+                # Subtitles and segments in the uploaded recording's time
+                downloads += [
+                    ("Subtitles (SRT)", to_srt(segments), f"{name}.srt", "text/plain"),
+                    ("Subtitles (VTT)", to_vtt(segments), f"{name}.vtt", "text/vtt"),
+                    ("Timestamps (JSONL)", to_jsonl(segments), f"{name}.segments.jsonl", "application/jsonl"),
+                ]
+            for column, (label, data, file_name, mime) in zip(st.columns(len(downloads)), downloads):
+                column.download_button(label, data, file_name, mime, key=f"download-{job['id']}-{file_name}")
+
+        def render_file(job):
+            """One uploaded file: its progress, results and, once it is done, its downloads."""
+            with st.container(border=True):
+                st.markdown(f"**{job['filename']}**")
+                render_job(job)
+                if job["status"] in (DONE, PARTIAL):
+                    render_downloads(job)
+
+        @st.fragment(run_every=JOB_POLL_SECONDS)
+        def render_live_jobs(job_ids):
+            jobs = [job_store.get(job_id) for job_id in job_ids]
+            if any(job["status"] in (DONE, PARTIAL, FAILED) for job in jobs):
+                # Redraw the whole page, which shows the finished file with its downloads
+                st.rerun()
+            for job in jobs:
+                render_file(job)
+
+        # File uploader with an enhanced interface
+        st.subheader("Upload your audio files")
+        uploaded_files = st.file_uploader(
+            "Choose one or more audio files to transcribe...",
+            type=["wav", "mp3", "m4a", "ogg", "flac"],
+            accept_multiple_files=True,
+        )
+
+        if uploaded_files:
+            # Submitting is explicit, so changing a setting never starts or repeats work by itself
+            if st.button("Transcribe", type="primary"):
+                # Every file is its own job; the workers share one queue of chunks between them.
+                # The same audio with the same settings maps to the same job, even within one upload
+                job_ids = list(dict.fromkeys(
+                    job_store.submit(uploaded_file, uploaded_file.name, settings, deduplicate=True)
+                    for uploaded_file in uploaded_files
+                ))
+                st.session_state["job_ids"] = job_ids
+                # Keep the jobs in the URL so a reload or reconnect finds them again
+                st.query_params["jobs"] = ",".join(job_ids)
+        else:
+            st.info("Upload audio files to begin.")
+
+        job_ids = st.session_state.get("job_ids") or list(dict.fromkeys(
+            job_id for job_id in st.query_params.get("jobs", "").split(",") if job_id
+        ))
+        jobs = [job for job in (job_store.get(job_id) for job_id in job_ids) if job is not None]
+
+        # Optional breakdown of each job's stage timings
+        with st.sidebar:
+            if st.toggle("Show timing panel", value=bool(st.secrets.get("SHOW_TIMINGS", False))) and jobs:
+                st.subheader("Timings")
+                for job in jobs:
+                    if len(jobs) > 1:
+                        st.markdown(f"**{job['filename']}**")
+                    render_timings(job)
+
+        if len(jobs) > 1:
+            finished = sum(job["status"] in (DONE, PARTIAL, FAILED) for job in jobs)
+            st.progress(finished / len(jobs), text=f"{finished} of {len(jobs)} files finished")
+        active_ids = []
+        for job in jobs:
+            if job["status"] in (QUEUED, RUNNING):
+                active_ids.append(job["id"])
+            else:
+                render_file(job)
+        if active_ids:
+            render_live_jobs(active_ids)
+
+        if (len(jobs) == 1 and jobs[0]["status"] in (DONE, PARTIAL)
+                and st.session_state.get("saved_job_id") != jobs[0]["id"]):
+            # Save the transcription and summary to files
+            with open("transcription.txt", "w", encoding="utf-8") as trans_file:
+                trans_file.write(jobs[0]["transcript"])
+            with open("summary_and_todo.txt", "w", encoding="utf-8") as summary_file:
+                summary_file.write(jobs[0]["summary"])
+            st.session_state["saved_job_id"] = jobs[0]["id"]
+            st.info("Transcription and summary have been saved to files.")
+
+        @st.cache_resource
+        def get_transcription_cache():
+            return TranscriptionCache(st.secrets.get("TRANSCRIPTION_CACHE_PATH", DEFAULT_CACHE_PATH))
+
+        # Size of the result cache the workers share
+        cache_stats = get_transcription_cache().stats()
+        with st.sidebar:
+            st.caption(
+                f"Cache: {cache_stats['entries']} entries ({cache_stats['bytes'] / (1024 * 1024):.1f} MB)"
+            )
+
+        # Add a logout button
+        authenticator.logout('Logout')
+
+    elif st.session_state['authentication_status'] is False:
+        st.error('Username or password is incorrect')
+    elif st.session_state['authentication_status'] is None:
+        st.warning('Please enter your username and password')
@@ -0,0 +1,288 @@
+"""Window-by-window decoding of uploaded audio with ffmpeg.
+
+Instead of decoding the whole upload into memory, every chunk is produced by
+its own ffmpeg call that seeks to the chunk's offset and decodes only that
+window. ``iter_audio_chunks`` is a generator of ``AudioChunk``s that are only
+encoded when a worker calls ``export``, so when it is fed to
+``dispatch_chunks`` up to ``max_workers`` windows are encoded and uploaded at
+once, the next one only once a worker is free, and the first chunk is
+uploading while the rest of the file is still untouched.
+"""
+import json
+import os
+import subprocess
+import tempfile
+from dataclasses import dataclass
+
+FFMPEG = "ffmpeg"
+FFPROBE = "ffprobe"
+
+# Whisper resamples everything to 16 kHz mono, so nothing above that reaches the model
+NORMALIZED_SAMPLE_RATE = 16000
+# Opus at this bitrate is transparent for 16 kHz mono speech
+NORMALIZED_BITRATE_KBPS = 24
+
+# File extension the API expects for each container ffprobe can report
+FORMAT_EXTENSIONS = {
+    "mp3": "mp3",
+    "wav": "wav",
+    "flac": "flac",
+    "ogg": "ogg",
+    "mov,mp4,m4a,3gp,3g2,mj2": "m4a",
+    "matroska,webm": "webm",
+    "mpeg": "mpeg",
+}
+
+
+class FFmpegError(RuntimeError):
+    """Raised when an ffmpeg or ffprobe call fails."""
+
+
+@dataclass(frozen=True)
+class ChunkEncoding:
+    """How exported chunks are encoded: ffmpeg codec, bitrate and container.
+
+    A ``codec`` of ``"copy"`` cuts the source's own packets without decoding
+    them; ``bitrate_kbps`` is then the source bitrate and only used for sizing.
+    """
+    codec: str = "aac"
+    bitrate_kbps: int = 128
+    muxer: str = "ipod"
+    extension: str = "m4a"
+
+    @property
+    def is_copy(self):
+        return self.codec == "copy"
+
+
+DEFAULT_ENCODING = ChunkEncoding()
+
+
+@dataclass
+class ChunkPart:
+    """Encoded audio of (part of) a chunk, ready to upload."""
+    start_ms: int
+    end_ms: int
+    data: bytes
+    extension: str = "m4a"
+
+    @property
+    def duration_ms(self):
+        return self.end_ms - self.start_ms
+
+
+@dataclass
+class AudioChunk:
+    """A window of the source audio, encoded by ``export`` on whichever thread transcribes it."""
+    index: int
+    start_ms: int
+    end_ms: int
+    path: str | None = None
+    encoding: ChunkEncoding = DEFAULT_ENCODING
+    # Encoded parts larger than this are split and encoded again
+    max_bytes: int | None = None
+    # Set when the chunk's transcription is already known and it needs no upload
+    text: str | None = None
+
+    @property
+    def duration_ms(self):
+        return self.end_ms - self.start_ms
+
+    @property
+    def extension(self):
+        return self.encoding.extension
+
+    def export(self):
+        """Encode the window and return it as ``ChunkPart``s, in order.
+
+        Usually that is a single part; a window that came out larger than
+        ``max_bytes`` is split in half and each half encoded again.
+        """
+        parts = []
+        pending = [(self.start_ms, self.end_ms)]
+        while pending:
+            start_ms, end_ms = pending.pop(0)
+            data = encode_window(self.path, start_ms, end_ms, self.encoding)
+            if self.max_bytes is not None and len(data) > self.max_bytes and end_ms - start_ms > 1000:
+                middle = (start_ms + end_ms) // 2
+                pending[:0] = [(start_ms, middle), (middle, end_ms)]
+                continue
+            parts.append(ChunkPart(start_ms, end_ms, data, self.encoding.extension))
+        return parts
+
+
+def _run(cmd):
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if proc.returncode != 0:
+        stderr = proc.stderr.decode("utf-8", errors="replace").strip()
+        raise FFmpegError(f"{cmd[0]} exited with code {proc.returncode}: {stderr[-500:]}")
+    return proc.stdout
+
+
+def probe_audio(path):
+    """Read duration, container, codec and bitrate of the first audio stream from the headers.
+
+    Returns a dict with ``duration_ms``, ``format_name``, ``codec_name``,
+    ``bit_rate`` (bits per second, or None when unknown), ``sample_rate`` and
+    ``channels``.
+    """
+    out = _run([
+        FFPROBE, "-v", "error",
+        "-select_streams", "a:0",
+        "-show_entries", "format=duration,bit_rate,format_name:stream=codec_name,bit_rate,sample_rate,channels",
+        "-of", "json",
+        path,
+    ])
+    info = json.loads(out.decode("utf-8"))
+    fmt = info.get("format", {})
+    streams = info.get("streams") or [{}]
+    stream = streams[0]
+    try:
+        duration_ms = int(float(fmt["duration"]) * 1000)
+    except (KeyError, ValueError):
+        raise FFmpegError(f"could not read the duration of {path}") from None
+
+    def as_int(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    return {
+        "duration_ms": duration_ms,
+        "format_name": fmt.get("format_name"),
+        "codec_name": stream.get("codec_name"),
+        # The stream bitrate is missing for some containers; fall back to the overall one
+        "bit_rate": as_int(stream.get("bit_rate")) or as_int(fmt.get("bit_rate")),
+        "sample_rate": as_int(stream.get("sample_rate")),
+        "channels": as_int(stream.get("channels")),
+    }
+
+
+def with_detected_extension(filename, probe):
+    """``filename`` with the extension of the container in ``probe``, whatever the upload was called."""
+    extension = FORMAT_EXTENSIONS.get(probe.get("format_name"))
+    if extension is None:
+        return filename
+    return f"{os.path.splitext(filename)[0]}.{extension}"
+
+
+def fixed_spans(duration_ms, chunk_length_ms):
+    """Split ``duration_ms`` into consecutive (start_ms, end_ms) windows."""
+    return [
+        (start_ms, min(start_ms + chunk_length_ms, duration_ms))
+        for start_ms in range(0, duration_ms, chunk_length_ms)
+    ]
+
+
+def _window_command(path, start_ms, end_ms, encoding, output):
+    if encoding.is_copy:
+        codec_args = ["-c:a", "copy"]
+    else:
+        codec_args = ["-c:a", encoding.codec, "-b:a", f"{encoding.bitrate_kbps}k"]
+    if output == "pipe:1" and encoding.muxer in ("ipod", "mp4"):
+        # MP4 normally seeks back to write its index; a fragmented file can be written to a pipe
+        codec_args += ["-movflags", "empty_moov+default_base_moof", "-frag_duration", "10000000"]
+    return [
+        FFMPEG, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+        # Seeking before -i means ffmpeg skips straight to the window
+        "-ss", f"{start_ms / 1000:.3f}",
+        "-t", f"{(end_ms - start_ms) / 1000:.3f}",
+        "-i", path,
+        "-vn", *codec_args,
+        "-f", encoding.muxer,
+        output,
+    ]
+
+
+def export_window(path, start_ms, end_ms, out_path, encoding=DEFAULT_ENCODING):
+    """Write ``[start_ms, end_ms)`` of ``path`` to ``out_path`` with ``encoding``.
+
+    With a copy encoding the window is cut at the nearest packet (frame)
+    boundaries and nothing is decoded or re-encoded.
+    """
+    _run(_window_command(path, start_ms, end_ms, encoding, out_path))
+
+
+def encode_window(path, start_ms, end_ms, encoding=DEFAULT_ENCODING):
+    """Like ``export_window``, but return the encoded window from ffmpeg's stdout without touching disk."""
+    return _run(_window_command(path, start_ms, end_ms, encoding, "pipe:1"))
+
+
+def normalize_audio(path, out_path, bitrate_kbps=NORMALIZED_BITRATE_KBPS):
+    """Write ``path`` to ``out_path`` as 16 kHz mono Opus in an Ogg container.
+
+    This is what the model hears anyway, at a fraction of the size of a
+    stereo 44.1/48 kHz upload, so the same recording needs fewer, smaller
+    chunks. The whole file is decoded once, streaming, with constant memory.
+    """
+    _run([
+        FFMPEG, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+        "-i", path,
+        "-vn", "-ac", "1", "-ar", str(NORMALIZED_SAMPLE_RATE),
+        "-c:a", "libopus", "-b:a", f"{bitrate_kbps}k", "-application", "voip",
+        "-f", "ogg",
+        out_path,
+    ])
+
+
+def extract_speech(path, regions, out_path, bitrate_kbps=NORMALIZED_BITRATE_KBPS):
+    """Write only the (start_ms, end_ms) ``regions`` of ``path``, back to back, to ``out_path``.
+
+    The output is 16 kHz mono Opus, as from ``normalize_audio``. The audio is
+    cut into 10 ms frames before selecting, so regions on 10 ms boundaries
+    are kept exactly and the lengths in the output match the regions.
+    """
+    half_frame = 0.005
+    selected = "+".join(
+        f"between(t,{start_ms / 1000 - half_frame:.3f},{end_ms / 1000 - half_frame:.3f})"
+        for start_ms, end_ms in regions
+    )
+    # The expression grows with the number of regions, so it goes in a file rather than on the command line,
+    # in a scratch directory so nothing is left next to the output if the process is killed
+    with tempfile.TemporaryDirectory(prefix="transcriber-") as scratch_dir:
+        script_path = os.path.join(scratch_dir, "speech.filter")
+        with open(script_path, "w") as script:
+            script.write(
+                f"aresample={NORMALIZED_SAMPLE_RATE},asetnsamples=n={NORMALIZED_SAMPLE_RATE // 100}:p=0,"
+                f"aselect='{selected}',asetpts=N/SR/TB"
+            )
+        _run([
+            FFMPEG, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+            "-i", path,
+            "-vn", "-ac", "1", "-filter_script:a", script_path,
+            "-c:a", "libopus", "-b:a", f"{bitrate_kbps}k", "-application", "voip",
+            "-f", "ogg",
+            out_path,
+        ])
+
+
+def encode_sample(path, duration_ms, silence_db=-40.0, bitrate_kbps=NORMALIZED_BITRATE_KBPS):
+    """Up to ``duration_ms`` of ``path`` from where the sound starts, as 16 kHz mono Opus bytes.
+
+    Leading audio quieter than ``silence_db`` is skipped, so a recording that
+    opens with dead air still gives a sample with speech in it. ffmpeg stops
+    reading as soon as the sample is full.
+    """
+    return _run([
+        FFMPEG, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+        "-i", path,
+        "-vn", "-ac", "1", "-ar", str(NORMALIZED_SAMPLE_RATE),
+        "-af", f"silenceremove=start_periods=1:start_threshold={silence_db}dB",
+        "-t", f"{duration_ms / 1000:.3f}",
+        "-c:a", "libopus", "-b:a", f"{bitrate_kbps}k", "-application", "voip",
+        "-f", "ogg",
+        "pipe:1",
+    ])
+
+
+def iter_audio_chunks(path, spans, encoding=DEFAULT_ENCODING, max_bytes=None, lookup=None):
+    """Yield an ``AudioChunk`` for each (start_ms, end_ms) span; nothing is encoded until ``export``.
+
+    ``max_bytes`` is passed on to every chunk's ``export``.
+    ``lookup((start_ms, end_ms))`` may return a previously stored transcription
+    for a span; such chunks are yielded with ``text`` set and need no export.
+    """
+    for index, (start_ms, end_ms) in enumerate(spans):
+        text = lookup((start_ms, end_ms)) if lookup is not None else None
+        yield AudioChunk(index, start_ms, end_ms, path, encoding, max_bytes, text)
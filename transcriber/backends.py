@@ -0,0 +1,205 @@
+"""Speech-to-text backends.
+
+The engine only calls ``backend.transcribe(file, filename, settings,
+duration_ms)`` and gets a ``Transcription`` back (the text and its timed
+segments), so the hosted API can be swapped for another service or a local
+model without touching chunking, caching or the pipeline. ``file`` is either
+bytes or an open binary file, and ``duration_ms`` the length of the audio
+when it is known. ``backend.detect_language`` takes the same arguments and
+returns the language spoken in the audio, as a name or an ISO 639-1 code, or
+None. Both methods also take the file's ``Metrics``, which requests through a
+``RequestScheduler`` record their waits and retries into. A backend's
+``name`` is part of every cache key, so results from different backends are
+never mixed up.
+
+``FasterWhisperBackend`` runs Whisper locally on the CPU with int8
+CTranslate2 weights. It needs the optional ``faster-whisper`` package
+(``pip install faster-whisper``) and is imported only when it is used.
+"""
+import io
+import threading
+from dataclasses import dataclass, field
+
+from .chunk_dispatch import DEFAULT_MAX_WORKERS
+from .metrics import bind_metrics
+from .profiles import TRANSLATE
+from .timestamps import Segment, segments_from_response
+
+# faster-whisper's names for the API models; anything else is passed through as a size or a path
+LOCAL_MODEL_NAMES = {
+    "whisper-large-v3": "large-v3",
+    "whisper-large-v3-turbo": "large-v3-turbo",
+}
+
+
+@dataclass
+class Transcription:
+    text: str
+    # Timed ``Segment``s, relative to the start of the audio that was transcribed
+    segments: list = field(default_factory=list)
+
+
+class GroqBackend:
+    """Whisper through the Groq API, or anything with the ``groq.Groq`` interface (see ``fakes.FakeGroq``).
+
+    With a ``RequestScheduler`` every request waits for the shared rate
+    limits and transient failures are retried. Responses are requested as
+    ``verbose_json`` for their segment (and, if asked for, word) timestamps.
+    """
+    name = "groq"
+
+    def __init__(self, client, scheduler=None):
+        self.client = client
+        self.scheduler = scheduler
+
+    def transcribe(self, file, filename, settings, duration_ms=None, metrics=None):
+        def request():
+            if hasattr(file, "seek"):
+                # A retry has to upload the file from the start again
+                file.seek(0)
+            if settings.task == TRANSLATE:
+                # Translations always come out in English, so there is no language to pass
+                return self.client.audio.translations.create(
+                    file=(filename, file),
+                    model=settings.transcription_model,
+                    prompt=settings.transcription_prompt,
+                    response_format="verbose_json",
+                    temperature=0.0,
+                )
+            # Without a language code Whisper works the language out for itself
+            language = {"language": settings.language_code} if settings.language_code else {}
+            return self.client.audio.transcriptions.create(
+                file=(filename, file),
+                model=settings.transcription_model,
+                prompt=settings.transcription_prompt,
+                response_format="verbose_json",
+                timestamp_granularities=["segment", "word"] if settings.word_timestamps else ["segment"],
+                temperature=0.0,
+                **language,
+            )
+
+        response = self._call(request, settings, duration_ms, metrics)
+        # Translations have no word timestamps
+        with_words = settings.word_timestamps and settings.task != TRANSLATE
+        return Transcription(response.text, segments_from_response(response, with_words))
+
+    def detect_language(self, file, filename, settings, duration_ms=None, metrics=None):
+        """The language the API hears in ``file``, as the name it reports, or None.
+
+        The API has no detection on its own, so the audio is transcribed
+        without a language and the one Whisper settled on is read back.
+        """
+        def request():
+            if hasattr(file, "seek"):
+                file.seek(0)
+            return self.client.audio.transcriptions.create(
+                file=(filename, file),
+                model=settings.transcription_model,
+                response_format="verbose_json",
+                temperature=0.0,
+            )
+
+        return getattr(self._call(request, settings, duration_ms, metrics), "language", None) or None
+
+    def _call(self, request, settings, duration_ms, metrics):
+        if self.scheduler is None:
+            with bind_metrics(metrics):
+                return request()
+        audio_seconds = duration_ms / 1000 if duration_ms else 0
+        return self.scheduler.call(request, settings.transcription_model, audio_seconds, metrics)
+
+
+@dataclass(frozen=True)
+class LocalWhisperSettings:
+    # A faster-whisper size or a converted model directory; None follows the profile's model
+    model: str | None = None
+    device: str = "cpu"
+    compute_type: str = "int8"
+    # CTranslate2 threads per transcription; 0 lets it decide
+    cpu_threads: int = 0
+    # Transcriptions that can run at once, one per concurrently dispatched chunk
+    num_workers: int = DEFAULT_MAX_WORKERS
+    # 30-second windows decoded together; 1 disables batched inference
+    batch_size: int = 8
+    download_root: str | None = None
+
+
+class FasterWhisperBackend:
+    """Whisper on the local CPU through faster-whisper (CTranslate2), with int8 weights by default.
+
+    Models are loaded once per process and shared by every thread; list
+    model names in ``preload`` to load them up front rather than on the first
+    request. Each chunk is split into 30-second windows that are decoded
+    ``batch_size`` at a time, and up to ``num_workers`` chunks run in parallel.
+    """
+
+    def __init__(self, settings=LocalWhisperSettings(), preload=()):
+        try:
+            import faster_whisper
+        except ImportError:
+            raise RuntimeError("the local backend needs faster-whisper: pip install faster-whisper") from None
+        self._faster_whisper = faster_whisper
+        self.settings = settings
+        # Cache keys already hold the profile's model; a model that overrides it has to be in them too
+        self.name = f"faster-whisper:{settings.compute_type}"
+        if settings.model is not None:
+            self.name += f":{settings.model}"
+        self._models = {}
+        self._lock = threading.Lock()
+        for model in preload:
+            self._model(model)
+
+    def _model(self, model):
+        name = self.settings.model or LOCAL_MODEL_NAMES.get(model, model)
+        with self._lock:
+            if name not in self._models:
+                whisper = self._faster_whisper.WhisperModel(
+                    name,
+                    device=self.settings.device,
+                    compute_type=self.settings.compute_type,
+                    cpu_threads=self.settings.cpu_threads,
+                    num_workers=self.settings.num_workers,
+                    download_root=self.settings.download_root,
+                )
+                if self.settings.batch_size > 1:
+                    whisper = self._faster_whisper.BatchedInferencePipeline(model=whisper)
+                self._models[name] = whisper
+            return self._models[name]
+
+    def transcribe(self, file, filename, settings, duration_ms=None, metrics=None):
+        if isinstance(file, (bytes, bytearray, memoryview)):
+            file = io.BytesIO(file)
+        options = {"batch_size": self.settings.batch_size} if self.settings.batch_size > 1 else {}
+        decoded, _ = self._model(settings.transcription_model).transcribe(
+            file,
+            task="translate" if settings.task == TRANSLATE else "transcribe",
+            language=None if settings.task == TRANSLATE else settings.language_code,
+            initial_prompt=settings.transcription_prompt or None,
+            word_timestamps=settings.word_timestamps,
+            temperature=0.0,
+            **options,
+        )
+        # Segments are decoded lazily as the generator is consumed
+        segments = [
+            Segment(
+                round(segment.start * 1000),
+                round(segment.end * 1000),
+                segment.text.strip(),
+                [[round(word.start * 1000), round(word.end * 1000), word.word.strip()] for word in segment.words]
+                if settings.word_timestamps else None,
+            )
+            for segment in decoded
+        ]
+        return Transcription(" ".join(segment.text for segment in segments), segments)
+
+    def detect_language(self, file, filename, settings, duration_ms=None, metrics=None):
+        """The ISO 639-1 code of the language in ``file``, from Whisper's own detection on the first 30 s.
+
+        faster-whisper detects the language before it decodes anything, and
+        the segments are never consumed, so nothing is transcribed.
+        """
+        if isinstance(file, (bytes, bytearray, memoryview)):
+            file = io.BytesIO(file)
+        options = {"batch_size": self.settings.batch_size} if self.settings.batch_size > 1 else {}
+        _, info = self._model(settings.transcription_model).transcribe(file, task="transcribe", **options)
+        return info.language
@@ -0,0 +1,269 @@
+"""Transcribe and summarize a directory (or glob) of recordings from the command line.
+
+Uses the same ``TranscriptionEngine`` as the app's workers, without the login or
+the one-file-at-a-time UI. Several files are processed at once; every
+transcription and chat request, whichever file it belongs to, goes through a
+``RequestScheduler`` whose limits are shared with the app's job workers, so
+the whole batch stays under the account's limits.
+
+Each recording gets its own ``<name>.transcript.txt``, ``<name>.summary.txt``
+and ``<name>.json`` (metadata) in the output directory, mirroring the input
+directory's layout, plus its timed segments as ``<name>.segments.jsonl`` and
+as ``<name>.srt`` and ``<name>.vtt`` subtitles. ``<name>`` keeps the
+recording's extension (``talk.mp3.summary.txt``), so ``talk.mp3`` and
+``talk.wav`` side by side do not overwrite each other. The JSON file is
+written last, so a recording whose JSON says ``"done"`` is skipped on the
+next run; failed and partially transcribed recordings are tried again, and
+their finished chunks come from the cache.
+At the end the time spent in each stage is printed; ``--metrics-log`` keeps
+every recording's timings and ``--metrics-port`` serves the running totals
+for Prometheus while the batch runs.
+
+    python transcribe_batch.py recordings/ --out transcripts/ --language Dutch
+    python transcribe_batch.py "recordings/2024-*.mp3" --profile large-v3 --jobs 4 --transcription-rpm 20
+    python transcribe_batch.py recordings/ --local --threads 8 --batch-size 16
+    python transcribe_batch.py recordings/ --word-timestamps
+    python transcribe_batch.py recordings/ --detect-language
+"""
+import argparse
+import dataclasses
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .backends import FasterWhisperBackend, GroqBackend
+from .chunk_dispatch import DEFAULT_MAX_WORKERS
+from .engine import LANGUAGE_CODES, TranscriptionEngine, TranscriptionSettings
+from .http_pool import PoolSettings, connection_metrics, make_groq_client
+from .jobs import add_local_whisper_arguments, local_whisper_settings
+from .metrics import PROCESS_METRICS, MetricsLog, serve_metrics
+from .profiles import DEFAULT_PROFILE, PROFILES, TRANSLATE
+from .scheduler import DEFAULT_SCHEDULER_PATH, MODEL_LIMITS, RateLimits, RequestScheduler, ScheduledChatClient
+from .timestamps import to_jsonl, to_srt, to_vtt
+from .transcription_cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_BYTES, TranscriptionCache
+
+# Files picked up when a directory is given
+AUDIO_EXTENSIONS = {".wav", ".mp3", ".m4a", ".ogg", ".opus", ".flac", ".webm", ".mp4", ".mpeg", ".mpga"}
+
+DEFAULT_OUTPUT_DIR = "transcripts"
+# Recordings processed at the same time
+DEFAULT_JOBS = 2
+
+DONE = "done"
+PARTIAL = "partial"
+FAILED = "failed"
+
+
+def find_recordings(inputs):
+    """Audio files named by ``inputs`` (files, directories or glob patterns), sorted and deduplicated."""
+    found = set()
+    for pattern in inputs:
+        for match in glob.glob(pattern, recursive=True) or [pattern]:
+            if os.path.isdir(match):
+                for directory, _, filenames in os.walk(match):
+                    found.update(
+                        os.path.join(directory, name) for name in filenames
+                        if os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS
+                    )
+            elif os.path.isfile(match):
+                found.add(match)
+    return sorted(os.path.abspath(path) for path in found)
+
+
+def output_base(path, root, output_dir):
+    """Output path, without suffix, for the recording at ``path``: its place under ``root`` in ``output_dir``.
+
+    The recording's extension stays in it, so recordings that differ only in
+    their extension get outputs of their own.
+    """
+    return os.path.join(output_dir, os.path.relpath(path, root))
+
+
+def read_metadata(base):
+    try:
+        with open(f"{base}.json", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_text(path, text):
+    # Write to a temporary file first so an interrupted run never leaves a truncated output
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(f"{path}.tmp", path)
+
+
+def process_recording(path, base, settings, engine):
+    """Transcribe and summarize one recording and write its outputs; returns the metadata."""
+    os.makedirs(os.path.dirname(base) or ".", exist_ok=True)
+    metadata = {"source": path, "settings": dataclasses.asdict(settings)}
+    started = time.perf_counter()
+    try:
+        result = engine.transcribe_file(path, os.path.basename(path), settings)
+    except Exception as e:
+        metadata.update(status=FAILED, error=str(e), seconds=time.perf_counter() - started)
+        _write_text(f"{base}.json", json.dumps(metadata, indent=2))
+        return metadata
+
+    _write_text(f"{base}.transcript.txt", result.transcript)
+    _write_text(f"{base}.summary.txt", result.summary)
+    if result.segments:
+        _write_text(f"{base}.segments.jsonl", to_jsonl(result.segments))
+        _write_text(f"{base}.srt", to_srt(result.segments))
+        _write_text(f"{base}.vtt", to_vtt(result.segments))
+    metadata.update(result.details())
+    metadata.update(status=DONE if result.complete else PARTIAL, seconds=time.perf_counter() - started)
+    _write_text(f"{base}.json", json.dumps(metadata, indent=2))
+    return metadata
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="+", help="audio files, directories or glob patterns")
+    parser.add_argument("--out", default=DEFAULT_OUTPUT_DIR, help="directory for the per-recording outputs")
+    parser.add_argument("--profile", default=DEFAULT_PROFILE.name, choices=list(PROFILES),
+                        help="models to use; 'translate' produces English from any language")
+    parser.add_argument("--language", default="English", choices=list(LANGUAGE_CODES),
+                        help="spoken language, also used for the summary")
+    parser.add_argument("--jobs", type=int, default=DEFAULT_JOBS, help="recordings processed at the same time")
+    parser.add_argument("--chunk-workers", type=int, default=DEFAULT_MAX_WORKERS,
+                        help="chunks of one recording transcribed at the same time")
+    parser.add_argument("--transcription-rpm", type=int,
+                        help="transcription requests per minute, shared with the workers (0: unlimited)")
+    parser.add_argument("--summary-rpm", type=int,
+                        help="chat requests per minute, shared with the workers (0: unlimited)")
+    parser.add_argument("--rate-limits-path", default=DEFAULT_SCHEDULER_PATH)
+    add_local_whisper_arguments(parser)
+    parser.add_argument("--keep-silences", action="store_true", help="do not trim long silences in large files")
+    parser.add_argument("--no-downsample", action="store_true", help="upload large files as recorded")
+    parser.add_argument("--keep-non-speech", action="store_true",
+                        help="do not remove silence and noise from large files before chunking")
+    parser.add_argument("--detect-language", action="store_true",
+                        help="transcribe each recording in the language heard in its first 30 s")
+    parser.add_argument("--word-timestamps", action="store_true",
+                        help="time every word in the segments file, not only every segment")
+    parser.add_argument("--force", action="store_true", help="process recordings that are already done")
+    parser.add_argument("--cache-path", default=os.environ.get("TRANSCRIPTION_CACHE_PATH", DEFAULT_CACHE_PATH))
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024))
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this port while running")
+    parser.add_argument("--metrics-log", help="append every recording's timings and counters to this JSON Lines file")
+    args = parser.parse_args()
+
+    if "GROQ_API_KEY" not in os.environ:
+        parser.error("set GROQ_API_KEY in the environment")
+
+    recordings = find_recordings(args.inputs)
+    if not recordings:
+        parser.error("no audio files found")
+    # Outputs mirror the layout below the deepest directory all inputs share
+    root = os.path.commonpath([os.path.dirname(path) for path in recordings])
+
+    pending = []
+    for path in recordings:
+        base = output_base(path, root, args.out)
+        metadata = read_metadata(base)
+        if not args.force and metadata is not None and metadata.get("status") == DONE:
+            continue
+        pending.append((path, base))
+    print(f"{len(recordings)} recordings, {len(recordings) - len(pending)} already done, {len(pending)} to go")
+    if not pending:
+        return
+
+    profile = PROFILES[args.profile]
+    # Translations come out in English, and so is their summary
+    language = "English" if profile.task == TRANSLATE else args.language
+    settings = TranscriptionSettings.from_profile(
+        profile,
+        language=language,
+        language_code=LANGUAGE_CODES[language],
+        trim_silence=not args.keep_silences,
+        downsample=not args.no_downsample,
+        skip_non_speech=not args.keep_non_speech,
+        word_timestamps=args.word_timestamps,
+        detect_language=args.detect_language,
+        max_concurrent_chunks=args.chunk_workers,
+    )
+    limits = dict(MODEL_LIMITS)
+    for model, rpm in ((profile.transcription_model, args.transcription_rpm),
+                       (profile.summary_model, args.summary_rpm)):
+        if rpm is not None:
+            limits[model] = dataclasses.replace(limits.get(model, RateLimits()), requests_per_minute=rpm or None)
+    # One client and one scheduler for every recording in the batch; the scheduler does the retrying
+    scheduler = RequestScheduler(args.rate_limits_path, limits)
+    # Enough pooled connections for every chunk of every recording in flight, plus their summaries
+    client = make_groq_client(settings=PoolSettings(
+        max_connections=args.jobs * (args.chunk_workers + 1),
+        max_keepalive_connections=args.jobs * (args.chunk_workers + 1),
+    ))
+    cache = TranscriptionCache(args.cache_path, args.cache_max_mb * 1024 * 1024)
+    local_whisper = local_whisper_settings(args, num_workers=args.jobs * args.chunk_workers)
+    if local_whisper is not None:
+        backend = FasterWhisperBackend(local_whisper, preload=[profile.transcription_model])
+    else:
+        backend = GroqBackend(client, scheduler)
+    engine = TranscriptionEngine(backend, ScheduledChatClient(client, scheduler), cache)
+    for name, source in (("rate_limits", scheduler), ("connections", connection_metrics()), ("cache", cache)):
+        PROCESS_METRICS.add_source(name, source)
+    if args.metrics_port is not None:
+        serve_metrics(args.metrics_port)
+    metrics_log = MetricsLog(args.metrics_log) if args.metrics_log else None
+
+    failures = 0
+    batch_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {
+            pool.submit(process_recording, path, base, settings, engine): path
+            for path, base in pending
+        }
+        for done_count, future in enumerate(as_completed(futures), start=1):
+            metadata = future.result()
+            name = os.path.relpath(futures[future], root)
+            if metrics_log is not None:
+                metrics_log.write({
+                    "source": futures[future], "status": metadata["status"], "metrics": metadata.get("metrics"),
+                    "timings": metadata.get("timings"),
+                })
+            if metadata["status"] == FAILED:
+                failures += 1
+                print(f"[{done_count}/{len(pending)}] failed  {name}: {metadata['error']}")
+            else:
+                if metadata["status"] == PARTIAL:
+                    failures += 1
+                if metadata["cached"]:
+                    chunks = "cached"
+                elif metadata["chunk_count"]:
+                    chunks = f"{metadata['chunk_count']} chunks"
+                else:
+                    # Usually one, none when there was no speech, one more when the language was detected
+                    requests = metadata["metrics"].get("counters", {}).get("transcription_requests", 0)
+                    chunks = f"{requests} request" if requests == 1 else f"{requests} requests"
+                print(f"[{done_count}/{len(pending)}] {metadata['status']:<7} {name} "
+                      f"({chunks}, {metadata['seconds']:.1f} s)")
+                if metadata.get("language_warning"):
+                    print(f"    {metadata['language_warning']}")
+    snapshot = PROCESS_METRICS.snapshot()
+    spans = sorted(snapshot["spans"].items(), key=lambda item: item[1]["seconds"], reverse=True)
+    print("Time per stage: " + ", ".join(
+        f"{stage} {span['seconds']:.1f} s" for stage, span in spans if stage != "total"
+    ))
+    # Recordings overlap, so throughput is over the wall time of the whole batch
+    wall_seconds = time.perf_counter() - batch_started
+    audio_seconds = snapshot["counters"].get("audio_seconds", 0)
+    print(f"{audio_seconds:.0f} s of audio in {wall_seconds:.0f} s ({audio_seconds / wall_seconds:.1f} s of audio "
+          f"per second), {snapshot['counters'].get('bytes_uploaded', 0) / (1024 * 1024):.1f} MB uploaded")
+    stats = scheduler.stats()
+    print(f"{stats['requests']} API requests, {stats['retries']} retried ({stats['rate_limited']} rate-limited), "
+          f"{stats['queued_seconds']:.0f} s spent waiting for rate limits")
+    connections = connection_metrics().stats()
+    print(f"{connections['new_connections']} connections opened, {connections['reused']} requests reused one")
+    if failures:
+        print(f"{failures} recordings failed or are incomplete; run again to retry them")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Concurrent chunk transcription with a bounded worker pool.
+
+The large-file path used to export and upload one chunk at a time. Here the
+chunks are fed to a thread pool that keeps at most ``max_workers`` exports and
+uploads in flight, collects each chunk's text (or error) and hands the results
+back in chunk order. Several files can share one pool, so that their chunks
+queue up for the same transcription slots.
+"""
+import contextlib
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+
+# How many chunks are exported and uploaded at the same time by default
+DEFAULT_MAX_WORKERS = 4
+
+
+@dataclass
+class ChunkResult:
+    """Outcome of transcribing a single chunk."""
+    index: int
+    text: str = ""
+    error: Exception | None = None
+    seconds: float = 0.0
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def _run_chunk(transcribe_chunk, index, chunk):
+    started = time.perf_counter()
+    try:
+        text = transcribe_chunk(index, chunk)
+    except Exception as e:
+        return ChunkResult(index, error=e, seconds=time.perf_counter() - started)
+    return ChunkResult(index, text=text, seconds=time.perf_counter() - started)
+
+
+def dispatch_chunks(chunks, transcribe_chunk, max_workers=DEFAULT_MAX_WORKERS, on_result=None, pool=None):
+    """Transcribe ``chunks`` concurrently and return the results in chunk order.
+
+    ``chunks`` may be any iterable, including a generator: it is only advanced
+    when a worker slot frees up, so no more than ``max_workers`` chunks are
+    materialised at once. ``transcribe_chunk(index, chunk)`` must return the
+    chunk's text; an exception marks that chunk as failed without stopping the
+    others. ``on_result(result)`` is called from the calling thread as each
+    chunk finishes, which makes it safe to update Streamlit widgets from it.
+
+    With a shared ``pool`` (an executor) the chunks run there instead of on a
+    pool of their own; ``max_workers`` still caps how many of this call's
+    chunks are in flight or waiting in it.
+    """
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least 1")
+
+    results = {}
+    chunk_iter = enumerate(chunks)
+    with contextlib.nullcontext(pool) if pool is not None else ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = set()
+        exhausted = False
+        while pending or not exhausted:
+            # Top the pool up to the concurrency cap
+            while not exhausted and len(pending) < max_workers:
+                try:
+                    index, chunk = next(chunk_iter)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending.add(pool.submit(_run_chunk, transcribe_chunk, index, chunk))
+
+            if not pending:
+                break
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                results[result.index] = result
+                if on_result is not None:
+                    on_result(result)
+
+    return [results[i] for i in sorted(results)]
+
+
+def join_transcript(results, separator="\n"):
+    """Join the text of the successful chunks, in chunk order."""
+    return separator.join(r.text for r in results if r.ok)
@@ -0,0 +1,180 @@
+"""Silence-aware chunk boundaries.
+
+Rather than cutting every ``chunk_length_ms`` regardless of what is being
+said, the planner measures the loudness of the audio in short frames and cuts
+each chunk at the quietest point shortly before the target length, so words
+are not split across chunks. Optionally, long silences at the start and end
+of a chunk are trimmed so they are not uploaded at all.
+
+The loudness envelope is computed from a low-rate mono decode that is read
+from ffmpeg block by block, and chunk spans are yielded as soon as each cut is
+known, so planning runs alongside the chunk exports rather than before them.
+"""
+import subprocess
+import tempfile
+
+import numpy as np
+
+from .audio_stream import FFMPEG, FFmpegError
+
+# Length of one loudness frame
+FRAME_MS = 50
+# Sample rate of the mono decode used for the loudness analysis
+ANALYSIS_RATE = 8000
+# Frames quieter than this count as silence
+SILENCE_DB = -40.0
+# How far before the target length the planner looks for a quiet cut point
+SEARCH_MS = 30 * 1000
+# Silences shorter than this are kept when trimming
+MIN_TRIM_MS = 2 * 1000
+# Silence kept around speech when a long silence is trimmed
+TRIM_PAD_MS = 250
+
+
+def _frames_db(samples, frame_len):
+    """Vectorised RMS loudness, in dBFS, of consecutive ``frame_len``-sample frames."""
+    frames = samples.astype(np.float32).reshape(-1, frame_len)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    return 20.0 * np.log10(np.maximum(rms, 1.0) / 32768.0)
+
+
+def iter_energy_db(path, frame_ms=FRAME_MS, sample_rate=ANALYSIS_RATE, block_seconds=60):
+    """Yield arrays of per-frame loudness (dBFS) for ``path``, ``block_seconds`` at a time."""
+    frame_len = sample_rate * frame_ms // 1000
+    frame_bytes = frame_len * 2
+    block_bytes = frame_bytes * (block_seconds * 1000 // frame_ms)
+
+    # A damaged file can make ffmpeg write megabytes of errors; a pipe nobody reads until the end would
+    # fill up and block it, so they go to a file and are only read for the error message
+    errors = tempfile.TemporaryFile()
+    proc = subprocess.Popen(
+        [
+            FFMPEG, "-nostdin", "-hide_banner", "-loglevel", "error",
+            "-i", path,
+            "-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "-",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=errors,
+    )
+    finished = False
+    try:
+        leftover = b""
+        while True:
+            data = proc.stdout.read(block_bytes)
+            if not data:
+                break
+            data = leftover + data
+            usable = len(data) - len(data) % frame_bytes
+            leftover = data[usable:]
+            if usable:
+                yield _frames_db(np.frombuffer(data[:usable], dtype="<i2"), frame_len)
+
+        # Pad the last partial frame with silence
+        if len(leftover) >= 2:
+            tail = np.frombuffer(leftover[:len(leftover) - len(leftover) % 2], dtype="<i2")
+            yield _frames_db(np.pad(tail, (0, frame_len - len(tail))), frame_len)
+        finished = True
+    finally:
+        if not finished:
+            # The consumer stopped early or something went wrong; don't leave ffmpeg running
+            proc.kill()
+        proc.stdout.close()
+        proc.wait()
+        with errors:
+            if finished and proc.returncode != 0:
+                errors.seek(max(errors.seek(0, 2) - 2000, 0))
+                stderr = errors.read().decode("utf-8", errors="replace").strip()
+                raise FFmpegError(f"ffmpeg exited with code {proc.returncode}: {stderr[-500:]}")
+
+
+def _best_cut(energy_db, search_frames):
+    """Index of the quietest frame in the last ``search_frames`` frames of ``energy_db``."""
+    start = max(len(energy_db) - search_frames, 1)
+    window = energy_db[start:]
+    # Smooth over ~250 ms so a single quiet frame between two words doesn't win
+    smoothed = np.convolve(window, np.ones(5) / 5, mode="same")
+    # Among the near-quietest frames take the latest one, which keeps chunks long
+    quiet = np.flatnonzero(smoothed <= smoothed.min() + 3.0)
+    return start + int(quiet[-1])
+
+
+def _trim(energy_db, silence_db, min_trim, pad):
+    """Return (first, last) frame bounds of ``energy_db`` without long leading/trailing silence."""
+    loud = np.flatnonzero(energy_db > silence_db)
+    if len(loud) == 0:
+        return None
+    first, last = 0, len(energy_db)
+    if loud[0] >= min_trim:
+        first = loud[0] - pad
+    if len(energy_db) - (loud[-1] + 1) >= min_trim:
+        last = loud[-1] + 1 + pad
+    return first, last
+
+
+def iter_chunk_spans(energy_blocks, target_ms, frame_ms=FRAME_MS, search_ms=SEARCH_MS,
+                     silence_db=SILENCE_DB, trim_silence=False,
+                     min_trim_ms=MIN_TRIM_MS, pad_ms=TRIM_PAD_MS):
+    """Yield (start_ms, end_ms) chunk spans of at most ``target_ms``, cut at quiet points.
+
+    ``energy_blocks`` is an iterable of loudness arrays such as ``iter_energy_db``
+    produces. A span is yielded as soon as enough audio has been analysed to
+    place its end, so the spans can be fed straight to ``iter_audio_chunks``.
+    With ``trim_silence`` set, silences of ``min_trim_ms`` or more at either end
+    of a chunk are dropped and chunks that are entirely silent are skipped.
+    """
+    target = max(target_ms // frame_ms, 2)
+    search = max(min(search_ms // frame_ms, target - 1), 1)
+    min_trim = max(min_trim_ms // frame_ms, 1)
+    pad = pad_ms // frame_ms
+
+    def span(offset, frames):
+        if trim_silence:
+            bounds = _trim(frames, silence_db, min_trim, pad)
+            if bounds is None:
+                return None
+            first, last = int(bounds[0]), int(bounds[1])
+        else:
+            first, last = 0, len(frames)
+        return (offset + first) * frame_ms, (offset + last) * frame_ms
+
+    buffered = np.empty(0, dtype=np.float32)
+    offset = 0
+    for block in energy_blocks:
+        buffered = np.concatenate([buffered, block])
+        while len(buffered) > target:
+            cut = _best_cut(buffered[:target], search)
+            planned = span(offset, buffered[:cut])
+            if planned is not None:
+                yield planned
+            buffered = buffered[cut:]
+            offset += cut
+
+    if len(buffered):
+        planned = span(offset, buffered)
+        if planned is not None:
+            yield planned
+
+
+def format_timestamp(ms):
+    """Format milliseconds as H:MM:SS."""
+    seconds = int(ms // 1000)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def describe_plan(spans, duration_ms, kept_ms=None):
+    """Human-readable summary of a chunk plan: one line per chunk plus the audio skipped.
+
+    ``kept_ms`` is the audio actually sent, when that is less than the spans
+    cover (because non-speech inside them was removed).
+    """
+    lines = [
+        f"Chunk {i+1}: {format_timestamp(start_ms)} – {format_timestamp(end_ms)}"
+        for i, (start_ms, end_ms) in enumerate(spans)
+    ]
+    if kept_ms is None:
+        kept_ms = sum(end_ms - start_ms for start_ms, end_ms in spans)
+    skipped_ms = max(duration_ms - kept_ms, 0)
+    # Rounding of the cuts alone leaves a few milliseconds, which would read as "Skipped 0:00:00"
+    if skipped_ms >= 1000:
+        lines.append(f"Skipped {format_timestamp(skipped_ms)} of silence and noise")
+    return "\n".join(lines)
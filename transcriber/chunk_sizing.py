@@ -0,0 +1,54 @@
+"""Chunk sizing: the longest chunk duration that still fits under the upload limit.
+
+A chunk's encoded size is predictable from its bitrate, so instead of a fixed
+10 minutes the chunk length is derived from the limit.
+
+Compressed sources in a codec the API accepts are cut without re-encoding
+(stream copy), which costs almost no CPU and loses no quality. Everything
+else, and sources whose bitrate is so high that copying would need many more
+requests, is transcoded to AAC at a fixed (average) bitrate that never
+exceeds the source's own bitrate, since re-encoding a 64 kbps voice memo at
+128 kbps only makes the upload bigger.
+"""
+from .audio_stream import ChunkEncoding
+
+# Codecs the transcription API accepts as-is, with the container to cut them into
+COPYABLE_CODECS = {
+    "mp3": ("mp3", "mp3"),
+    "aac": ("ipod", "m4a"),
+    "flac": ("flac", "flac"),
+    "opus": ("ogg", "ogg"),
+    "vorbis": ("ogg", "ogg"),
+}
+# Sources above this bitrate are transcoded rather than copied
+COPY_MAX_KBPS = 192
+
+# Bitrate used for chunks when the source is at least this good
+CHUNK_BITRATE_KBPS = 128
+# Lowest bitrate worth encoding speech at
+MIN_CHUNK_BITRATE_KBPS = 32
+# Container framing on top of the raw audio bitstream
+CONTAINER_OVERHEAD = 0.02
+# Headroom for bitrate variation in the encoder
+SIZE_SAFETY = 0.95
+
+
+def choose_encoding(probe, max_kbps=CHUNK_BITRATE_KBPS, allow_copy=True):
+    """Pick the chunk encoding for a source described by ``probe_audio``."""
+    source_kbps = (probe.get("bit_rate") or 0) // 1000
+    copyable = COPYABLE_CODECS.get(probe.get("codec_name"))
+    if allow_copy and copyable and 0 < source_kbps <= COPY_MAX_KBPS:
+        muxer, extension = copyable
+        return ChunkEncoding(codec="copy", bitrate_kbps=source_kbps, muxer=muxer, extension=extension)
+
+    if source_kbps:
+        bitrate_kbps = max(min(source_kbps, max_kbps), MIN_CHUNK_BITRATE_KBPS)
+    else:
+        bitrate_kbps = max_kbps
+    return ChunkEncoding(bitrate_kbps=bitrate_kbps)
+
+
+def max_chunk_ms(limit_bytes, bitrate_kbps):
+    """Longest chunk, in milliseconds, whose estimated size stays under ``limit_bytes``."""
+    bytes_per_ms = bitrate_kbps * 1000 / 8 / 1000 * (1 + CONTAINER_OVERHEAD)
+    return int(limit_bytes * SIZE_SAFETY / bytes_per_ms)
@@ -0,0 +1,580 @@
+"""Transcribe and summarize one audio file, outside of any UI.
+
+``TranscriptionEngine`` does the work the Streamlit scripts used to do
+inline: check the cache, transcribe small files directly, and send large
+files through the chunk planner and the overlapping transcription/summary
+pipeline. Speech-to-text goes through a backend (see ``backends``), the
+summary through a chat client with the ``groq.Groq`` interface. Progress is
+reported through callbacks so the same code can run in a background worker
+and feed a job store, or run in a command-line tool.
+
+With ``downsample`` set the upload is first converted to 16 kHz mono Opus,
+which is all the model uses; a typical stereo recording shrinks several
+times over, so it is more often sent in one request and otherwise needs
+fewer chunks.
+
+With ``skip_non_speech`` set, voice activity detection runs first and only
+the speech is written to that file (see ``vad``). Chunk boundaries are
+reported in the original recording's time through the ``SpeechMap``.
+
+Every transcription also comes with timed segments (see ``timestamps``).
+A chunk's segments are shifted by where the chunk starts and then mapped
+through the ``SpeechMap``, so ``TranscriptionResult.segments`` is always in
+the time of the recording that was uploaded. Segments are cached next to
+the text they belong to.
+
+With ``detect_language`` set, the first 30 seconds of sound are sent on
+their own before anything else, without a language, and the language the
+backend hears is locked in for the whole file: every chunk is transcribed,
+and the summary written, in that language. When it is not the one that was
+chosen the result carries a ``language_warning``, rather than the file
+having to be transcribed a second time once the mistake is noticed.
+
+Every stage of a file is timed into a ``Metrics`` of its own (see
+``metrics``), which ends up in ``TranscriptionResult.metrics`` and is added
+to the engine's process-wide totals. The backend and the summary client are
+handed the same ``Metrics``, so the file's rate-limit waits, retries and
+connection reuse are counted there even while other files share the
+process.
+"""
+import dataclasses
+import itertools
+import os
+import tempfile
+from dataclasses import dataclass, field
+
+from .audio_stream import (
+    FFmpegError,
+    encode_sample,
+    extract_speech,
+    iter_audio_chunks,
+    normalize_audio,
+    probe_audio,
+    with_detected_extension,
+)
+from .chunk_dispatch import DEFAULT_MAX_WORKERS
+from .chunk_plan import describe_plan, iter_chunk_spans, iter_energy_db
+from .chunk_sizing import choose_encoding, max_chunk_ms
+from .metrics import PROCESS_METRICS, Metrics
+from .pipeline import run_pipeline
+from .profiles import DEFAULT_PROFILE, TRANSCRIBE
+from .summarize import DEFAULT_MAX_INPUT_TOKENS, SUMMARY_PROMPT, summarize_transcript
+from .timestamps import parse_jsonl, to_jsonl
+from .transcription_cache import hash_file, hash_text, make_key
+from .vad import detect_speech
+
+TRANSCRIPTION_PROMPT = ""
+
+# Sound sent to detect the spoken language; Whisper only listens to the first 30 s anyway
+LANGUAGE_SAMPLE_MS = 30_000
+
+# Languages offered for transcription and summary, with their ISO 639-1 codes
+LANGUAGE_CODES = {
+    "English": "en",
+    "Spanish": "es",
+    "French": "fr",
+    "German": "de",
+    "Italian": "it",
+    "Dutch": "nl",
+    "Portuguese": "pt",
+}
+
+
+@dataclass
+class TranscriptionSettings:
+    """Everything that decides what a transcription job produces."""
+    language: str = "English"
+    language_code: str = "en"
+    trim_silence: bool = True
+    # Convert files above threshold_mb to 16 kHz mono Opus before deciding whether to split
+    downsample: bool = False
+    # Drop silence and noise from files above threshold_mb before chunking; implies downsampling
+    skip_non_speech: bool = False
+    # Files above this size are split into chunks that each stay below it
+    threshold_mb: int = 20
+    max_concurrent_chunks: int = DEFAULT_MAX_WORKERS
+    transcription_model: str = DEFAULT_PROFILE.transcription_model
+    transcription_prompt: str = TRANSCRIPTION_PROMPT
+    summary_model: str = DEFAULT_PROFILE.summary_model
+    task: str = TRANSCRIBE
+    # Time every word as well as every segment
+    word_timestamps: bool = False
+    # Transcribe in the language heard in the first LANGUAGE_SAMPLE_MS, whatever ``language`` says
+    detect_language: bool = False
+
+    @classmethod
+    def from_profile(cls, profile, **fields):
+        """Settings with the models and task of ``profile``; ``fields`` sets the rest."""
+        return cls(
+            transcription_model=profile.transcription_model,
+            summary_model=profile.summary_model,
+            task=profile.task,
+            **fields,
+        )
+
+
+@dataclass
+class TranscriptionResult:
+    transcript: str
+    summary: str
+    # True when the transcription came from the cache without any API call
+    cached: bool = False
+    chunk_plan: str | None = None
+    # Size of the upload, and how much smaller downsampling made it
+    source_bytes: int = 0
+    bytes_saved: int = 0
+    # Audio removed by voice activity detection, and where the kept audio
+    # came from: [speech_start_ms, original_start_ms, duration_ms] per region
+    non_speech_ms: int = 0
+    speech_map: list | None = None
+    chunk_count: int = 0
+    reused_chunks: int = 0
+    chunk_errors: list[str] = field(default_factory=list)
+    timings: dict[str, float] = field(default_factory=dict)
+    # Stage spans and counters of this file; see ``Metrics.snapshot``
+    metrics: dict = field(default_factory=dict)
+    # Timed ``Segment``s in the original recording's time
+    segments: list = field(default_factory=list)
+    # Language of the transcript and summary; with ``detect_language``, what the
+    # backend heard at the start, and a warning when that was not the one chosen
+    language: str | None = None
+    detected_language: str | None = None
+    language_warning: str | None = None
+
+    @property
+    def complete(self):
+        """Whether every part of the audio was transcribed."""
+        return not self.chunk_errors
+
+    def details(self):
+        """Everything but the transcript, summary and segments, as a JSON-serialisable dict."""
+        details = dataclasses.asdict(self)
+        del details["transcript"], details["summary"], details["segments"]
+        return details
+
+
+class TranscriptionEngine:
+    """Transcribes and summarizes files with one backend, one chat client and one result cache.
+
+    The engine holds no per-file state, so one instance can serve several
+    files at the same time. Each file's metrics are also added to ``metrics``.
+    With a ``chunk_pool`` (an executor) the chunks of every file it serves
+    share that pool's threads instead of each file starting its own, so
+    files transcribed together split one concurrency budget.
+    """
+
+    def __init__(self, backend, summary_client, cache, metrics=PROCESS_METRICS, chunk_pool=None):
+        self.backend = backend
+        self.summary_client = summary_client
+        self.cache = cache
+        self.metrics = metrics
+        self.chunk_pool = chunk_pool
+
+    def summary_key(self, text, settings):
+        return make_key(
+            "summary", hash_text(text), settings.summary_model, SUMMARY_PROMPT, settings.language,
+            DEFAULT_MAX_INPUT_TOKENS,
+        )
+
+    def _summary_client(self, metrics):
+        # A ScheduledChatClient can record its calls' waits and retries in the file's metrics
+        with_metrics = getattr(self.summary_client, "with_metrics", None)
+        return with_metrics(metrics) if with_metrics is not None and metrics is not None else self.summary_client
+
+    def summarize(self, text, settings, on_token=None, metrics=None):
+        """Summary and to-do list for ``text``, served from the cache when possible.
+
+        On a cache miss the summary is streamed to ``on_token`` as it is written.
+        """
+        def create_summary():
+            # Long transcripts are summarized in parts and merged
+            return summarize_transcript(self._summary_client(metrics), text, settings.language,
+                                        settings.summary_model, on_token=on_token)
+
+        return self.cache.get_or_compute(self.summary_key(text, settings), create_summary)
+
+    def _get_transcription(self, key, settings):
+        """The cached text and segments under ``key``, or None unless both are there."""
+        text = self.cache.get(key)
+        if text is None:
+            return None
+        segments = self.cache.get(make_key("segments", key, settings.word_timestamps))
+        if segments is None:
+            return None
+        return text, parse_jsonl(segments)
+
+    def _put_transcription(self, key, settings, text, segments):
+        self.cache.put(key, text)
+        self.cache.put(make_key("segments", key, settings.word_timestamps), to_jsonl(segments))
+
+    def transcribe_file(self, path, filename, settings, file_hash=None, probe=None,
+                        on_progress=None, on_transcript=None, on_token=None):
+        """Transcribe and summarize the audio file at ``path`` and return a ``TranscriptionResult``.
+
+        ``file_hash`` and ``probe`` (``probe_audio`` of ``path``) save reading
+        the file again when they are already known, e.g. from ``ingest_upload``.
+        ``on_progress(fraction, message)`` reports progress,
+        ``on_transcript(text)`` receives the transcript so far whenever it
+        grows and ``on_token(token)`` the summary as it is streamed. Failed
+        chunks are listed in ``chunk_errors`` rather than failing the whole
+        file.
+        """
+        metrics = Metrics(parent=self.metrics)
+        detected_language, language_warning = None, None
+        with metrics.span("total"):
+            # Identical audio with identical settings always gives the same transcription
+            if file_hash is None:
+                with metrics.span("hash"):
+                    file_hash = hash_file(path)
+            if settings.detect_language and settings.task == TRANSCRIBE:
+                if on_progress is not None:
+                    on_progress(0.0, "Detecting the language...")
+                with metrics.span("detect_language"):
+                    detected_language = self._detect_language(path, filename, settings, file_hash, metrics)
+                if detected_language is not None:
+                    settings, language_warning = lock_language(settings, detected_language)
+            result = self._transcribe_file(
+                path, filename, settings, file_hash, probe, on_progress, on_transcript, on_token, metrics,
+            )
+        result.language = settings.language
+        result.detected_language = detected_language
+        result.language_warning = language_warning
+        metrics.add("files")
+        result.metrics = metrics.snapshot()
+        return result
+
+    def _detect_language(self, path, filename, settings, file_hash, metrics):
+        """The language the backend hears at the start of the file at ``path``, or None; cached per file."""
+        key = make_key("language", file_hash, self.backend.name, settings.transcription_model, LANGUAGE_SAMPLE_MS)
+        language = self.cache.get(key)
+        if language is None:
+            try:
+                sample = encode_sample(path, LANGUAGE_SAMPLE_MS)
+            except FFmpegError:
+                # Whatever is wrong with the file is reported when it is transcribed
+                return None
+            language = ""
+            if sample:
+                metrics.add("transcription_requests")
+                metrics.add("bytes_uploaded", len(sample))
+                with metrics.span("transcription_request"):
+                    language = self.backend.detect_language(
+                        sample, f"{os.path.splitext(filename)[0]}.ogg", settings, LANGUAGE_SAMPLE_MS, metrics,
+                    ) or ""
+            # An empty answer is kept as well: there was no speech to detect a language from
+            self.cache.put(key, language)
+        return language or None
+
+    def _transcribe_file(self, path, filename, settings, file_hash, probe, on_progress, on_transcript, on_token,
+                         metrics):
+        def progress(fraction, message):
+            if on_progress is not None:
+                on_progress(fraction, message)
+
+        transcription_key = make_key(
+            "transcription", file_hash, self.backend.name, settings.task, settings.transcription_model,
+            settings.language_code, settings.transcription_prompt, settings.trim_silence, settings.downsample,
+            settings.skip_non_speech,
+        )
+        cached_transcription = self._get_transcription(transcription_key, settings)
+        if cached_transcription is not None:
+            transcript, segments = cached_transcription
+            if on_transcript is not None:
+                on_transcript(transcript)
+            metrics.add("cached_files")
+            progress(1.0, "Summarizing...")
+            with metrics.span("summary"):
+                summary = self.summarize(transcript, settings, on_token, metrics)
+            return TranscriptionResult(transcript, summary, cached=True, segments=segments)
+
+        source_bytes = os.path.getsize(path)
+        # Both read the whole file before the first upload; a file that goes in one request anyway is sent as it is
+        preprocess = settings.downsample or settings.skip_non_speech
+        if not preprocess or source_bytes <= settings.threshold_mb * 1024 * 1024:
+            result = self._transcribe_audio(
+                path, filename, settings, file_hash, transcription_key, progress, on_transcript, on_token, metrics,
+                probe=probe,
+            )
+            result.source_bytes = source_bytes
+            return result
+
+        # The downsampled copy is a file, since chunking seeks in it; it goes in a scratch directory of its own
+        # rather than next to the upload, which may be a read-only folder of recordings
+        speech_map = None
+        with tempfile.TemporaryDirectory(prefix="transcriber-") as scratch_dir:
+            downsampled_path = os.path.join(scratch_dir, "16k.ogg")
+            if settings.skip_non_speech:
+                progress(0.0, "Finding speech...")
+                with metrics.span("vad"):
+                    speech_map = detect_speech(path)
+                if not speech_map.regions:
+                    return TranscriptionResult(
+                        "", "", source_bytes=source_bytes, non_speech_ms=speech_map.duration_ms, speech_map=[],
+                    )
+                progress(0.0, "Extracting speech...")
+                with metrics.span("extract_speech"):
+                    extract_speech(path, speech_map.regions, downsampled_path)
+            else:
+                progress(0.0, "Downsampling to 16 kHz mono...")
+                with metrics.span("downsample"):
+                    normalize_audio(path, downsampled_path)
+            downsampled_bytes = os.path.getsize(downsampled_path)
+            # The speech map only describes the speech-only file, so that one is always used
+            if downsampled_bytes < source_bytes or speech_map is not None:
+                audio_path = downsampled_path
+                filename = f"{os.path.splitext(filename)[0]}.ogg"
+            else:
+                # Already compact (a low-bitrate mono voice memo); keep the original
+                audio_path = path
+                downsampled_bytes = source_bytes
+            result = self._transcribe_audio(
+                audio_path, filename, settings, file_hash, transcription_key, progress, on_transcript, on_token,
+                metrics, speech_map, probe if audio_path == path else None,
+            )
+        result.source_bytes = source_bytes
+        result.bytes_saved = max(source_bytes - downsampled_bytes, 0)
+        if speech_map is not None:
+            result.non_speech_ms = speech_map.removed_ms
+            result.speech_map = speech_map.as_list()
+        return result
+
+    def _transcribe_audio(self, path, filename, settings, file_hash, transcription_key, progress,
+                          on_transcript, on_token, metrics, speech_map=None, probe=None):
+        cache = self.cache
+        file_size_mb = os.path.getsize(path) / (1024 * 1024)
+        if probe is None:
+            # Only the headers are read; nothing is decoded yet
+            try:
+                with metrics.span("probe"):
+                    probe = probe_audio(path)
+            except (FFmpegError, OSError):
+                # A small file can still be sent without knowing its duration
+                if file_size_mb > settings.threshold_mb:
+                    raise
+        if file_size_mb <= settings.threshold_mb:
+            # File size is within threshold, we can directly transcribe
+            progress(0.0, "Transcribing...")
+            # The duration counts against the audio budget
+            duration_ms = probe["duration_ms"] if probe is not None else None
+            if probe is not None:
+                # The API goes by the extension, so a misnamed upload is sent under its real format
+                filename = with_detected_extension(filename, probe)
+            recording_ms = speech_map.duration_ms if speech_map is not None else duration_ms
+            if recording_ms:
+                metrics.add("audio_seconds", recording_ms / 1000)
+            if duration_ms:
+                metrics.add("audio_seconds_uploaded", duration_ms / 1000)
+            metrics.add("bytes_uploaded", os.path.getsize(path))
+            metrics.add("transcription_requests")
+            # The backend streams the open file into the request body; it is never read into memory here
+            with open(path, "rb") as file, metrics.span("transcription_request"):
+                transcription = self.backend.transcribe(file, filename, settings, duration_ms, metrics)
+            transcript = transcription.text
+            segments = transcription.segments
+            if speech_map is not None:
+                segments = [segment.to_original(speech_map) for segment in segments]
+            self._put_transcription(transcription_key, settings, transcript, segments)
+            if on_transcript is not None:
+                on_transcript(transcript)
+            progress(1.0, "Summarizing...")
+            with metrics.span("summary"):
+                summary = self.summarize(transcript, settings, on_token, metrics)
+            return TranscriptionResult(transcript, summary, segments=segments)
+
+        # Decode and split the audio one time window at a time
+        total_duration_ms = probe["duration_ms"]
+        metrics.add("audio_seconds", (speech_map.duration_ms if speech_map is not None else total_duration_ms) / 1000)
+
+        # Pick the longest chunk that still encodes to less than threshold_mb
+        chunk_limit_bytes = settings.threshold_mb * 1024 * 1024
+        chunk_encoding = choose_encoding(probe)
+        chunk_length_ms = max_chunk_ms(chunk_limit_bytes, chunk_encoding.bitrate_kbps)
+
+        # Cut each chunk at a pause shortly before chunk_length_ms; the spans
+        # are planned while the audio is analysed, so uploads start right away
+        energy = iter_energy_db(path)
+        planned_spans = iter_chunk_spans(energy, chunk_length_ms, trim_silence=settings.trim_silence)
+        with metrics.span("chunk_plan"):
+            first_span = next(planned_spans, None)
+        if first_span is None:
+            # Nothing but silence; there is nothing to send, as when voice activity detection finds no speech
+            return TranscriptionResult("", "", chunk_plan=describe_chunks([], total_duration_ms, speech_map))
+        planned_spans = itertools.chain([first_span], planned_spans)
+
+        # Every chunk's transcription is checkpointed under the file and the
+        # plan that produced it, so a rerun after a failure only sends the
+        # chunks that are still missing
+        chunk_plan_key = make_key(
+            "chunk-plan", file_hash, self.backend.name, settings.task, settings.transcription_model,
+            settings.language_code, settings.transcription_prompt, chunk_length_ms, settings.trim_silence,
+            settings.downsample, settings.skip_non_speech, chunk_encoding.codec, chunk_encoding.bitrate_kbps,
+        )
+
+        def chunk_key(span):
+            return make_key("chunk", chunk_plan_key, span)
+
+        # Each chunk's segments, by span, in the time of the audio being chunked
+        chunk_segments = {}
+
+        def lookup_chunk(span):
+            cached_chunk = self._get_transcription(chunk_key(span), settings)
+            if cached_chunk is None:
+                return None
+            text, chunk_segments[span] = cached_chunk
+            return text
+
+        # Remember the span of every exported chunk, in dispatch order
+        chunk_spans = []
+        reused_chunks = []
+
+        def exported_chunks():
+            chunks = iter_audio_chunks(path, planned_spans, chunk_encoding, chunk_limit_bytes, lookup=lookup_chunk)
+            while True:
+                # Analysing the audio for the next cut happens lazily, here on the calling thread
+                with metrics.span("chunk_plan"):
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    return
+                chunk_spans.append((chunk.start_ms, chunk.end_ms))
+                if chunk.text is not None:
+                    reused_chunks.append(chunk.index)
+                    metrics.add("reused_chunks")
+                yield chunk
+
+        # Transcribe a single exported chunk; runs on a worker thread
+        def transcribe_chunk(i, chunk):
+            if chunk.text is not None:
+                return chunk.text
+            # Encoded on the worker thread, so several chunks are exported at once
+            with metrics.span("chunk_export"):
+                parts = chunk.export()
+            texts, segments = [], []
+            for j, part in enumerate(parts):
+                metrics.add("transcription_requests")
+                metrics.add("bytes_uploaded", len(part.data))
+                metrics.add("audio_seconds_uploaded", part.duration_ms / 1000)
+                # A chunk that was split to stay under the size limit is sent in several parts
+                part_name = f"{filename}_chunk{i+1}" + (f"_{j+1}" if len(parts) > 1 else "")
+                with metrics.span("transcription_request"):
+                    transcription = self.backend.transcribe(
+                        part.data, f"{part_name}.{part.extension}", settings, part.duration_ms, metrics,
+                    )
+                texts.append(transcription.text)
+                segments += [segment.shifted(part.start_ms) for segment in transcription.segments]
+            text = "\n".join(texts)
+            span = (chunk.start_ms, chunk.end_ms)
+            chunk_segments[span] = segments
+            self._put_transcription(chunk_key(span), settings, text, segments)
+            return text
+
+        # Track progress by the amount of audio transcribed
+        finished = []
+        transcript_parts = []
+
+        def on_chunk_done(result):
+            finished.append(result)
+            done_ms = sum(chunk_spans[r.index][1] - chunk_spans[r.index][0] for r in finished)
+            progress(min(done_ms / max(total_duration_ms, 1), 1.0), f"Transcribed {len(finished)} chunks...")
+
+        # Pass on the transcript so far each time the next chunk in order is done
+        def show_transcript(result):
+            if result.ok and on_transcript is not None:
+                transcript_parts.append(result.text)
+                on_transcript("\n".join(transcript_parts))
+
+        # Windows are decoded lazily, so the first chunk uploads while the rest wait,
+        # and parts of the summary are written while later chunks are transcribed
+        pipeline_result = run_pipeline(
+            exported_chunks(),
+            transcribe_chunk,
+            self._summary_client(metrics),
+            settings.language,
+            settings.summary_model,
+            max_workers=settings.max_concurrent_chunks,
+            on_result=on_chunk_done,
+            on_transcript=show_transcript,
+            on_token=on_token,
+            pool=self.chunk_pool,
+        )
+        chunk_results = pipeline_result.chunk_results
+        # Summarizing overlaps transcription; only what it added afterwards counts as the summary stage
+        metrics.observe("summary", pipeline_result.timings["summary_after_transcription"])
+
+        # The chunk texts were combined and summarized by the pipeline
+        transcript = pipeline_result.transcript
+        cache.put(self.summary_key(transcript, settings), pipeline_result.summary)
+
+        # Segments of the chunks that were transcribed, in order and in the original recording's time
+        segments = [
+            segment
+            for result in chunk_results if result.ok
+            for segment in chunk_segments.get(chunk_spans[result.index], [])
+        ]
+        if speech_map is not None:
+            segments = [segment.to_original(speech_map) for segment in segments]
+
+        # Only a complete transcription is worth keeping
+        if all(result.ok for result in chunk_results):
+            self._put_transcription(transcription_key, settings, transcript, segments)
+
+        return TranscriptionResult(
+            transcript,
+            pipeline_result.summary,
+            chunk_plan=describe_chunks(chunk_spans, total_duration_ms, speech_map),
+            chunk_count=len(chunk_spans),
+            reused_chunks=len(reused_chunks),
+            chunk_errors=[
+                f"An error occurred while transcribing chunk {result.index+1}: {result.error}"
+                for result in chunk_results if not result.ok
+            ],
+            timings=pipeline_result.timings,
+            segments=segments,
+        )
+
+
+def resolve_language(language):
+    """The name and code in ``LANGUAGE_CODES`` of a language given as either, in any case; None if not offered."""
+    language = language.strip().lower()
+    for name, code in LANGUAGE_CODES.items():
+        if language in (name.lower(), code):
+            return name, code
+    return None
+
+
+def lock_language(settings, detected):
+    """``settings`` changed to transcribe in the ``detected`` language, and a warning if it is not the chosen one.
+
+    ``detected`` is a language name or an ISO 639-1 code, as a backend reports
+    it. A language that is not offered is still transcribed as such (by its
+    code when it is one, otherwise by leaving the language to Whisper), but
+    the summary stays in the chosen language.
+    """
+    resolved = resolve_language(detected)
+    if resolved is not None:
+        name, code = resolved
+        if code == settings.language_code:
+            return settings, None
+        warning = (
+            f"{settings.language} was selected, but the recording is in {name}, "
+            f"so it was transcribed and summarized in {name}."
+        )
+        return dataclasses.replace(settings, language=name, language_code=code), warning
+    name = detected.strip()
+    # Local models report codes, the API reports names, which it does not accept back
+    code = name.lower() if len(name) <= 3 else None
+    warning = (
+        f"{settings.language} was selected, but the recording is in {name.title() if code is None else name}, "
+        f"which is not one of the offered languages; it was transcribed in that language and summarized in "
+        f"{settings.language}."
+    )
+    return dataclasses.replace(settings, language_code=code), warning
+
+
+def describe_chunks(chunk_spans, duration_ms, speech_map=None):
+    """``describe_plan`` for the chunks, in the original recording's time when non-speech was removed."""
+    if speech_map is None:
+        return describe_plan(chunk_spans, duration_ms)
+    kept_ms = sum(end_ms - start_ms for start_ms, end_ms in chunk_spans)
+    return describe_plan(
+        [speech_map.span_to_original(span) for span in chunk_spans], speech_map.duration_ms, kept_ms,
+    )
@@ -0,0 +1,244 @@
+"""Local stand-ins for the Groq API, for exercising the pipeline offline.
+
+``FakeGroq`` exposes the same ``audio.transcriptions.create`` and
+``chat.completions.create`` call shapes as ``groq.Groq`` and can inject
+latency and failures, so the chunked path and the summarizer can be run and
+timed without network access or an API key.
+
+``StubGroqServer`` goes one level lower: a local HTTP server that answers the
+real ``groq.Groq`` client (pointed at it with ``base_url``) and can respond
+with 429s and server errors, for exercising retries and rate limiting.
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+
+class FakeTranscriptions:
+    def __init__(self, latency=0.0, jitter=0.0, fail_rate=0.0, fail_calls=(), seed=0, spoken_language="english"):
+        self.latency = latency
+        # What a request without a language reports hearing
+        self.spoken_language = spoken_language
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.fail_calls = set(fail_calls)
+        self.calls = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.max_in_flight = 0
+
+    def create(self, file, model, prompt="", response_format="json", temperature=0.0, language=None, **kwargs):
+        name, data = file
+        if hasattr(data, "read"):
+            # Small files are passed as an open file object, like the real client accepts
+            data = data.read()
+        with self._lock:
+            call_number = len(self.calls)
+            self.calls.append({"name": name, "bytes": len(data), "model": model, "language": language})
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            fail = call_number in self.fail_calls or self._random.random() < self.fail_rate
+        try:
+            time.sleep(delay)
+            if fail:
+                raise RuntimeError(f"fake transcription failure for {name}")
+            text = f"[{name}: {len(data)} bytes]"
+            if response_format == "verbose_json":
+                return SimpleNamespace(**fake_verbose_transcription(
+                    text, kwargs.get("timestamp_granularities"), language or self.spoken_language,
+                ))
+            return SimpleNamespace(text=text)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+
+def fake_verbose_transcription(text, timestamp_granularities=None, language="english"):
+    """A ``verbose_json`` body for ``text``: one segment, one second per word."""
+    words = text.split()
+    response = {
+        "text": text, "language": language,
+        "segments": [{"id": 0, "start": 0.0, "end": float(len(words)), "text": text}],
+    }
+    if timestamp_granularities and "word" in timestamp_granularities:
+        response["words"] = [{"word": word, "start": float(i), "end": i + 1.0} for i, word in enumerate(words)]
+    return response
+
+
+def fake_summary(user_text):
+    """The deterministic reply to ``user_text``."""
+    digest = hashlib.sha256(user_text.encode("utf-8")).hexdigest()[:8]
+    return f"[summary {digest} of {len(user_text.split())} words]"
+
+
+class FakeChatCompletions:
+    """Deterministic chat completions: the reply only depends on the messages."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def create(self, messages, model, stream=False, **kwargs):
+        with self._lock:
+            self.calls.append({"messages": messages, "model": model, "stream": stream})
+        time.sleep(self.latency)
+        content = fake_summary(messages[-1]["content"])
+        if stream:
+            pieces = [word + " " for word in content.split(" ")]
+            pieces[-1] = pieces[-1].rstrip()
+            return (
+                SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+                for piece in pieces
+            )
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class FakeGroq:
+    """Drop-in replacement for ``groq.Groq`` in the transcription and summary paths."""
+
+    def __init__(self, chat_latency=0.0, **transcription_options):
+        transcriptions = FakeTranscriptions(**transcription_options)
+        # Translations take the same arguments, less the language
+        self.audio = SimpleNamespace(transcriptions=transcriptions, translations=transcriptions)
+        self.chat = SimpleNamespace(completions=FakeChatCompletions(latency=chat_latency))
+
+
+class StubGroqServer:
+    """A local HTTP server that speaks enough of the Groq API for ``groq.Groq(base_url=server.base_url)``.
+
+    The first ``rate_limit_first`` requests, and a ``rate_limit_rate`` share of
+    the rest, get a 429 with a ``retry-after`` of ``retry_after`` seconds; an
+    ``error_rate`` share gets a 503. Every response is delayed by
+    ``latency`` seconds. Use it as a context manager::
+
+        with StubGroqServer(rate_limit_first=2) as server:
+            client = Groq(api_key="stub", base_url=server.base_url, max_retries=0)
+    """
+
+    def __init__(self, latency=0.0, rate_limit_first=0, rate_limit_rate=0.0, retry_after=1.0, error_rate=0.0,
+                 seed=0):
+        self.latency = latency
+        self.rate_limit_first = rate_limit_first
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        # (path, status) of every request, in arrival order
+        self.requests = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _stub_handler(self))
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def status_for(self, path):
+        """Decide the status of the next request and record it."""
+        with self._lock:
+            draw = self._random.random()
+            if len(self.requests) < self.rate_limit_first or draw < self.rate_limit_rate:
+                status = 429
+            elif draw < self.rate_limit_rate + self.error_rate:
+                status = 503
+            else:
+                status = 200
+            self.requests.append((path, status))
+        return status
+
+
+def _stub_handler(server):
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive, so clients can reuse connections as they would with the real API
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _read_body(self):
+            if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+                body = bytearray()
+                while True:
+                    size = int(self.rfile.readline().split(b";")[0], 16)
+                    if size == 0:
+                        self.rfile.readline()
+                        return bytes(body)
+                    body += self.rfile.read(size)
+                    self.rfile.readline()
+            return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        def _send(self, status, body, content_type="application/json", headers=()):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            body = self._read_body()
+            time.sleep(server.latency)
+            status = server.status_for(self.path)
+            if status == 429:
+                error = {"error": {"message": "Rate limit reached", "type": "tokens", "code": "rate_limit_exceeded"}}
+                self._send(429, json.dumps(error).encode(), headers=[("retry-after", str(server.retry_after))])
+            elif status != 200:
+                self._send(status, json.dumps({"error": {"message": "Service unavailable"}}).encode())
+            elif self.path.endswith(("/audio/transcriptions", "/audio/translations")):
+                text = f"[stub transcription of {len(body)} bytes]"
+                # The form fields are not parsed; looking for their values in the body is enough here
+                if b"verbose_json" in body:
+                    granularities = ["word"] if b"\r\n\r\nword\r\n" in body else None
+                    reply = fake_verbose_transcription(text, granularities)
+                else:
+                    reply = {"text": text}
+                self._send(200, json.dumps(reply).encode())
+            elif self.path.endswith("/chat/completions"):
+                self._complete(json.loads(body))
+            else:
+                self._send(404, json.dumps({"error": {"message": f"no route for {self.path}"}}).encode())
+
+        def _complete(self, request):
+            content = fake_summary(request["messages"][-1]["content"])
+            base = {"id": "stub", "created": int(time.time()), "model": request["model"]}
+            if not request.get("stream"):
+                reply = dict(base, object="chat.completion", choices=[{
+                    "index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop",
+                }])
+                self._send(200, json.dumps(reply).encode())
+                return
+            events = []
+            for word in content.split(" "):
+                chunk = dict(base, object="chat.completion.chunk", choices=[{
+                    "index": 0, "delta": {"content": word + " "}, "finish_reason": None,
+                }])
+                events.append(f"data: {json.dumps(chunk)}\n\n")
+            events.append("data: [DONE]\n\n")
+            self._send(200, "".join(events).encode(), content_type="text/event-stream")
+
+    return Handler
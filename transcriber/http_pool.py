@@ -0,0 +1,134 @@
+"""One pooled, keep-alive HTTP client per process for all API calls.
+
+Every ``groq.Groq`` client made by ``make_groq_client`` sends its requests
+through the same ``httpx.Client``, so transcription and chat calls reuse open
+connections (and their TLS sessions) instead of paying for a TCP and TLS
+handshake each time a client is created. Pool size and timeouts come from
+``PoolSettings``.
+
+``ConnectionMetrics`` counts requests, newly opened connections and TLS
+handshakes through httpcore's ``trace`` request extension; a request that did
+not open a connection reused one from the pool. A request made while a
+``Metrics`` is bound to the thread (see ``metrics.bind_metrics``) is counted
+there as well, so each file gets its own share.
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+import httpx
+
+from .metrics import bound_metrics
+
+
+@dataclass(frozen=True)
+class PoolSettings:
+    # At least as many as the requests that can be in flight at once
+    max_connections: int = 32
+    max_keepalive_connections: int = 32
+    # Idle connections are closed after this many seconds
+    keepalive_expiry: float = 60.0
+    connect_timeout: float = 10.0
+    # Transcribing a long chunk can take a while before the first byte comes back
+    read_timeout: float = 300.0
+    write_timeout: float = 120.0
+    # How long a request may wait for a free connection
+    pool_timeout: float = 60.0
+
+
+DEFAULT_POOL_SETTINGS = PoolSettings()
+
+
+class ConnectionMetrics:
+    """Connection reuse counters, fed by httpcore trace events."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "new_connections": 0, "tls_handshakes": 0, "connect_seconds": 0.0}
+
+    def trace_request(self, request):
+        """httpx request hook: attach a tracer that reports this request's connection events."""
+        connect_started = []
+        # The hook runs on the thread making the request, which is where the caller bound its metrics
+        metrics = bound_metrics()
+
+        def count(name, value=1):
+            with self._lock:
+                self._stats[name] += value
+            if metrics is not None:
+                metrics.add(f"http_{name}", value)
+
+        def trace(event_name, info):
+            if event_name == "connection.connect_tcp.started":
+                connect_started.append(time.perf_counter())
+            elif event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+                count("new_connections" if event_name == "connection.connect_tcp.complete" else "tls_handshakes")
+                count("connect_seconds", time.perf_counter() - connect_started[-1])
+                connect_started[-1] = time.perf_counter()
+            elif event_name.endswith(".send_request_headers.started"):
+                count("requests")
+
+        request.extensions["trace"] = trace
+
+    def stats(self):
+        """Requests, new connections, TLS handshakes and time spent connecting, plus ``reused``."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["reused"] = max(stats["requests"] - stats["new_connections"], 0)
+        return stats
+
+
+def create_http_client(settings=DEFAULT_POOL_SETTINGS, metrics=None):
+    """A new pooled ``httpx.Client`` configured by ``settings``, reporting to ``metrics`` if given."""
+    from groq import DefaultHttpxClient
+
+    return DefaultHttpxClient(
+        limits=httpx.Limits(
+            max_connections=settings.max_connections,
+            max_keepalive_connections=settings.max_keepalive_connections,
+            keepalive_expiry=settings.keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(
+            connect=settings.connect_timeout,
+            read=settings.read_timeout,
+            write=settings.write_timeout,
+            pool=settings.pool_timeout,
+        ),
+        event_hooks={"request": [metrics.trace_request]} if metrics is not None else None,
+    )
+
+
+_shared_lock = threading.Lock()
+_shared = {}
+
+
+def shared_http_client(settings=DEFAULT_POOL_SETTINGS):
+    """This process's pooled client and its ``ConnectionMetrics``; created on first use."""
+    with _shared_lock:
+        if "client" not in _shared:
+            metrics = ConnectionMetrics()
+            _shared["client"] = create_http_client(settings, metrics)
+            _shared["metrics"] = metrics
+        return _shared["client"], _shared["metrics"]
+
+
+def connection_metrics():
+    """The ``ConnectionMetrics`` of this process's shared client."""
+    return shared_http_client()[1]
+
+
+def make_groq_client(api_key=None, settings=DEFAULT_POOL_SETTINGS, max_retries=0):
+    """A ``groq.Groq`` client on the shared pool.
+
+    Clients are cheap once the pool exists, but there is no reason to make
+    more than one. Retries default to off because ``RequestScheduler`` does them.
+    """
+    from groq import Groq
+
+    http_client, _ = shared_http_client(settings)
+    return Groq(
+        api_key=api_key if api_key is not None else os.environ["GROQ_API_KEY"],
+        http_client=http_client,
+        max_retries=max_retries,
+    )
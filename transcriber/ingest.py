@@ -0,0 +1,69 @@
+"""Copy an upload to disk in one pass, hashing it on the way and reading its headers.
+
+Writing ``uploaded_file.read()`` holds the whole recording as one bytes
+object, and hashing it afterwards reads it all again. ``ingest_upload``
+copies the source in fixed-size blocks and feeds every block to the hash as
+it is written, so memory use does not grow with the upload. Once the last
+block is on disk ffprobe reads the container, codec and duration from the
+headers, which is all the chunk planner needs; the content hash is the
+cache key. The worker that picks the file up can therefore look up the cache
+and plan chunks without reading the file again.
+
+The container comes from the headers, not the file name, so a misnamed
+upload is still sent to the API with the right extension.
+"""
+import hashlib
+import os
+from dataclasses import dataclass
+
+from .audio_stream import FFmpegError, probe_audio
+
+# Size of each block copied and hashed
+INGEST_BLOCK_SIZE = 1024 * 1024
+
+
+@dataclass
+class IngestedUpload:
+    path: str
+    size: int
+    sha256: str
+    # ``probe_audio`` of the copy, or None when ffprobe could not read it
+    probe: dict | None = None
+
+
+def _blocks(source, block_size):
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            yield from iter(lambda: f.read(block_size), b"")
+        return
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        # Slices of a memoryview are views, so nothing is copied before it is written
+        view = memoryview(source)
+        for start in range(0, len(view), block_size):
+            yield view[start:start + block_size]
+        return
+    # Reading beats getbuffer() here: a BytesIO made from bytes copies them all on getbuffer()
+    if hasattr(source, "seek"):
+        source.seek(0)
+    yield from iter(lambda: source.read(block_size), b"")
+
+
+def ingest_upload(source, path, block_size=INGEST_BLOCK_SIZE):
+    """Copy ``source`` to ``path`` block by block and return an ``IngestedUpload``.
+
+    ``source`` is a path, a bytes-like object or a binary file object, such
+    as Streamlit's UploadedFile.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "wb") as out:
+        for block in _blocks(source, block_size):
+            out.write(block)
+            digest.update(block)
+            size += len(block)
+    try:
+        probe = probe_audio(path)
+    except (FFmpegError, OSError):
+        # Not readable as audio, or no ffprobe; the worker reports the error when it decodes
+        probe = None
+    return IngestedUpload(path, size, digest.hexdigest(), probe)
@@ -0,0 +1,473 @@
+"""Background transcription jobs.
+
+The Streamlit script reruns on every widget interaction, so work done inline
+can be abandoned or repeated halfway through. Instead, an upload is handed to
+a ``JobStore`` (a SQLite database plus a directory of uploaded files) and gets
+a job id back; worker processes claim queued jobs, run them through a
+``TranscriptionEngine`` and write progress, partial transcript, summary and
+errors back to the store. The UI only submits and polls, so jobs keep running
+when the browser disconnects.
+
+Workers can be started by the app itself or separately::
+
+    python -m transcriber.jobs worker --processes 2 --jobs-per-worker 4 --chunk-workers 8
+
+A worker runs several jobs at once (``--jobs-per-worker``), and all of their
+chunks wait in one pool of ``--chunk-workers`` transcription slots, so a
+batch of uploads keeps the worker's whole concurrency budget busy while each
+file is summarized as soon as its own chunks are done.
+
+While a job runs its worker refreshes it every ``HEARTBEAT_INTERVAL_SECONDS``,
+even when nothing else is written for a long time (a wait for the hourly
+audio budget, a long local transcription), so only a job whose worker has
+really stopped is queued again. Every claim gets an owner token, and writes
+from a worker that no longer owns the job are ignored, so a requeued job is
+never finished by both its old and its new worker.
+
+With ``--metrics-port`` every worker serves its totals for Prometheus at
+``/metrics``, the first on that port and the others on the ports after it;
+``--metrics-log`` appends every finished job's stage timings and counters to
+a JSON Lines file.
+"""
+import argparse
+import dataclasses
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import closing
+
+from .backends import FasterWhisperBackend, GroqBackend, LocalWhisperSettings
+from .chunk_dispatch import DEFAULT_MAX_WORKERS
+from .engine import TranscriptionEngine, TranscriptionSettings
+from .http_pool import DEFAULT_POOL_SETTINGS, PoolSettings, connection_metrics, make_groq_client
+from .ingest import ingest_upload
+from .metrics import PROCESS_METRICS, MetricsLog, serve_metrics
+from .profiles import DEFAULT_PROFILE
+from .scheduler import DEFAULT_SCHEDULER_PATH, RequestScheduler, ScheduledChatClient
+from .timestamps import parse_jsonl, to_jsonl
+from .transcription_cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_BYTES, TranscriptionCache, make_key
+
+DEFAULT_JOBS_DIR = ".jobs"
+# A running job whose worker has not written anything for this long is queued again
+STALE_AFTER_SECONDS = 10 * 60
+# How often a worker marks its running jobs as alive; well within STALE_AFTER_SECONDS
+HEARTBEAT_INTERVAL_SECONDS = 60
+# Minimum time between progress writes from a worker
+WRITE_INTERVAL_SECONDS = 0.5
+# Jobs one worker process runs at the same time
+DEFAULT_JOBS_PER_WORKER = 4
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+# Finished, but some chunks failed; submitting the file again retries only those
+PARTIAL = "partial"
+FAILED = "failed"
+
+_COLUMNS = (
+    "id", "key", "filename", "settings", "source", "status", "progress", "message", "transcript", "summary",
+    "details", "error", "owner", "created", "updated",
+)
+
+
+def job_key(file_hash, settings):
+    """Jobs for the same audio with the same settings share this key."""
+    return make_key("job", file_hash, dataclasses.asdict(settings))
+
+
+class JobStore:
+    """Job queue and results, shared by the app and the worker processes."""
+
+    def __init__(self, directory=DEFAULT_JOBS_DIR):
+        self.directory = directory
+        self.uploads_dir = os.path.join(directory, "uploads")
+        os.makedirs(self.uploads_dir, exist_ok=True)
+        self.db_path = os.path.join(directory, "jobs.sqlite3")
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY,"
+                " key TEXT,"
+                " filename TEXT NOT NULL,"
+                " settings TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " progress REAL NOT NULL DEFAULT 0,"
+                " message TEXT NOT NULL DEFAULT '',"
+                " transcript TEXT NOT NULL DEFAULT '',"
+                " summary TEXT NOT NULL DEFAULT '',"
+                " details TEXT NOT NULL DEFAULT '{}',"
+                " error TEXT,"
+                # Timed segments as JSON Lines; kept out of _COLUMNS so polling a job does not read them
+                " segments TEXT NOT NULL DEFAULT '',"
+                # Hash, size and probed headers of the upload, as JSON
+                " source TEXT NOT NULL DEFAULT '{}',"
+                # Token of the claim that is running the job
+                " owner TEXT,"
+                " created REAL NOT NULL,"
+                " updated REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key)")
+
+    def _connect(self):
+        # A fresh connection per call keeps the store safe to use from any thread or process
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # A sqlite3 connection used as a context manager only commits; this closes it as well
+        return closing(conn)
+
+    def upload_path(self, job_id):
+        return os.path.join(self.uploads_dir, job_id)
+
+    def submit(self, source, filename, settings, deduplicate=False):
+        """Queue a job for the audio in ``source`` and return its id.
+
+        ``source`` is anything ``ingest_upload`` accepts: a path, a bytes-like
+        object or a binary file object. It is copied in blocks and hashed and
+        probed on the way, and the worker reuses the hash and headers instead
+        of reading the file again.
+
+        With ``deduplicate``, if a job for the same audio and settings is
+        queued, running or done, that job's id is returned instead of
+        starting the work again. Failed and partial jobs are not reused, so
+        submitting again is how their missing chunks are retried.
+        """
+        job_id = uuid.uuid4().hex
+        with PROCESS_METRICS.span("upload_write"):
+            upload = ingest_upload(source, self.upload_path(job_id))
+        key = job_key(upload.sha256, settings) if deduplicate else None
+        with self._connect() as conn:
+            if key is not None:
+                row = conn.execute(
+                    "SELECT id FROM jobs WHERE key = ? AND status NOT IN (?, ?) ORDER BY created DESC LIMIT 1",
+                    (key, FAILED, PARTIAL),
+                ).fetchone()
+                if row is not None:
+                    os.remove(upload.path)
+                    return row[0]
+
+            now = time.time()
+            conn.execute(
+                "INSERT INTO jobs (id, key, filename, settings, source, status, created, updated)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id, key, filename, json.dumps(dataclasses.asdict(settings)),
+                    json.dumps({"sha256": upload.sha256, "size": upload.size, "probe": upload.probe}),
+                    QUEUED, now, now,
+                ),
+            )
+            return job_id
+
+    def get(self, job_id):
+        """The job as a dict, or None if there is no such job."""
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job_from_row(row) if row is not None else None
+
+    def get_segments(self, job_id):
+        """The job's timed ``Segment``s; empty until it is done."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT segments FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return parse_jsonl(row[0]) if row is not None else []
+
+    def claim(self):
+        """Atomically move the oldest queued job to running and return it, or None.
+
+        The job's ``owner`` is a new token; pass it to ``update``, ``heartbeat``
+        and ``finish`` so they only take effect while this claim holds the job.
+        """
+        owner = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, owner = NULL, message = 'Requeued after a worker stopped' "
+                    "WHERE status = ? AND updated < ?",
+                    (QUEUED, RUNNING, time.time() - STALE_AFTER_SECONDS),
+                )
+                row = conn.execute(
+                    f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE status = ? ORDER BY created LIMIT 1",
+                    (QUEUED,),
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, owner = ?, updated = ? WHERE id = ?",
+                        (RUNNING, owner, time.time(), row[0]),
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job = _job_from_row(row)
+        job["status"] = RUNNING
+        job["owner"] = owner
+        return job
+
+    def update(self, job_id, owner=None, **fields):
+        """Write some of a job's columns; ``details`` is stored as JSON.
+
+        With ``owner`` nothing is written unless that claim still holds the
+        job. Returns whether the job was written.
+        """
+        if "details" in fields:
+            fields["details"] = json.dumps(fields["details"])
+        fields["updated"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        query, params = f"UPDATE jobs SET {assignments} WHERE id = ?", [*fields.values(), job_id]
+        if owner is not None:
+            query += " AND owner = ?"
+            params.append(owner)
+        with self._connect() as conn:
+            return conn.execute(query, params).rowcount > 0
+
+    def heartbeat(self, job_id, owner):
+        """Mark a running job as alive; returns False once ``owner`` no longer holds it."""
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE jobs SET updated = ? WHERE id = ? AND owner = ? AND status = ?",
+                (time.time(), job_id, owner, RUNNING),
+            ).rowcount > 0
+
+    def finish(self, job_id, owner=None, **fields):
+        """Record a job's final state and delete its uploaded audio.
+
+        With ``owner``, a claim that lost the job leaves both alone, since the
+        worker that holds it now still needs the upload.
+        """
+        if not self.update(job_id, owner, **fields):
+            return False
+        upload = self.upload_path(job_id)
+        if os.path.exists(upload):
+            os.remove(upload)
+        return True
+
+
+def _job_from_row(row):
+    job = dict(zip(_COLUMNS, row))
+    job["settings"] = json.loads(job["settings"])
+    job["source"] = json.loads(job["source"])
+    job["details"] = json.loads(job["details"])
+    return job
+
+
+def run_job(store, job, engine, metrics_log=None):
+    """Run one claimed job to completion, writing progress to the store as it goes.
+
+    With a ``MetricsLog`` the job's metrics (stage timings, and counters that
+    include its rate-limit waits and connection reuse) are also appended to it.
+    """
+    job_id = job["id"]
+    owner = job.get("owner")
+    state = {"progress": 0.0, "message": "", "transcript": "", "summary": ""}
+    last_write = [0.0]
+
+    def write(force=False):
+        now = time.monotonic()
+        if force or now - last_write[0] >= WRITE_INTERVAL_SECONDS:
+            store.update(job_id, owner, **state)
+            last_write[0] = now
+
+    def on_progress(fraction, message):
+        state["progress"] = fraction
+        state["message"] = message
+        write()
+
+    def on_transcript(text):
+        state["transcript"] = text
+        write()
+
+    summary_tokens = []
+
+    def on_token(token):
+        summary_tokens.append(token)
+        state["summary"] = "".join(summary_tokens)
+        write()
+
+    # Keeps the job from looking stale while a single call runs for a long time
+    stopped = threading.Event()
+
+    def heartbeat():
+        while not stopped.wait(HEARTBEAT_INTERVAL_SECONDS):
+            if not store.heartbeat(job_id, owner):
+                return
+
+    if owner is not None:
+        threading.Thread(target=heartbeat, name=f"heartbeat-{job_id}", daemon=True).start()
+    try:
+        settings = TranscriptionSettings(**job["settings"])
+        # The hash and headers were read when the upload was stored
+        result = engine.transcribe_file(
+            store.upload_path(job_id), job["filename"], settings,
+            file_hash=job["source"].get("sha256"), probe=job["source"].get("probe"),
+            on_progress=on_progress, on_transcript=on_transcript, on_token=on_token,
+        )
+    except Exception as e:
+        store.finish(job_id, owner, status=FAILED, error=str(e), message="Failed")
+        if metrics_log is not None:
+            metrics_log.write({"job": job_id, "filename": job["filename"], "status": FAILED, "error": str(e)})
+        return
+    finally:
+        stopped.set()
+
+    details = result.details()
+    status = DONE if result.complete else PARTIAL
+    if metrics_log is not None:
+        metrics_log.write({
+            "job": job_id, "filename": job["filename"], "status": status, "metrics": details["metrics"],
+            "timings": details["timings"],
+        })
+    store.finish(
+        job_id,
+        owner,
+        status=status,
+        progress=1.0,
+        message="Transcription completed!" if result.complete else "Transcription completed with missing chunks",
+        transcript=result.transcript,
+        summary=result.summary,
+        details=details,
+        segments=to_jsonl(result.segments),
+    )
+
+
+def work(directory=DEFAULT_JOBS_DIR, cache_path=DEFAULT_CACHE_PATH, cache_max_bytes=DEFAULT_MAX_BYTES,
+         scheduler_path=DEFAULT_SCHEDULER_PATH, pool_settings=DEFAULT_POOL_SETTINGS, local_whisper=None,
+         metrics_port=None, metrics_log=None, jobs_per_worker=DEFAULT_JOBS_PER_WORKER,
+         chunk_workers=DEFAULT_MAX_WORKERS, poll_interval=1.0):
+    """Worker loop: claim and run jobs until the process is stopped.
+
+    With ``local_whisper`` (``LocalWhisperSettings``) speech is transcribed
+    on this machine instead of through the API; summaries still use the API.
+    ``metrics_port`` serves this worker's totals for Prometheus and
+    ``metrics_log`` is the path of a JSON Lines file to append job metrics to.
+    Up to ``jobs_per_worker`` jobs run at once, their chunks sharing
+    ``chunk_workers`` threads.
+    """
+    store = JobStore(directory)
+    # Retries are left to the scheduler, which shares rate limits with the other workers
+    scheduler = RequestScheduler(scheduler_path)
+    # One client on one connection pool for every transcription and chat call this worker makes
+    client = make_groq_client(settings=pool_settings)
+    if local_whisper is not None:
+        # Load the default model now, so the first job does not wait for it
+        backend = FasterWhisperBackend(local_whisper, preload=[DEFAULT_PROFILE.transcription_model])
+    else:
+        backend = GroqBackend(client, scheduler)
+    cache = TranscriptionCache(cache_path, cache_max_bytes)
+    # The queue every running job's chunks wait in, whichever file they belong to
+    chunk_pool = ThreadPoolExecutor(max_workers=chunk_workers)
+    engine = TranscriptionEngine(backend, ScheduledChatClient(client, scheduler), cache, chunk_pool=chunk_pool)
+    for name, source in (("rate_limits", scheduler), ("connections", connection_metrics()), ("cache", cache)):
+        PROCESS_METRICS.add_source(name, source)
+    if metrics_port is not None:
+        serve_metrics(metrics_port)
+    log = MetricsLog(metrics_log) if metrics_log is not None else None
+    running = set()
+    with ThreadPoolExecutor(max_workers=jobs_per_worker) as job_pool:
+        while True:
+            if len(running) >= jobs_per_worker:
+                _, running = wait(running, return_when=FIRST_COMPLETED)
+                continue
+            job = store.claim()
+            if job is None:
+                time.sleep(poll_interval)
+                continue
+            running.add(job_pool.submit(run_job, store, job, engine, log))
+
+
+def start_workers(processes, directory=DEFAULT_JOBS_DIR, cache_path=DEFAULT_CACHE_PATH,
+                  cache_max_bytes=DEFAULT_MAX_BYTES, scheduler_path=DEFAULT_SCHEDULER_PATH,
+                  pool_settings=DEFAULT_POOL_SETTINGS, local_whisper=None, metrics_port=None, metrics_log=None,
+                  jobs_per_worker=DEFAULT_JOBS_PER_WORKER, chunk_workers=DEFAULT_MAX_WORKERS):
+    """Start ``processes`` daemon worker processes and return them.
+
+    Worker ``i`` serves its metrics on ``metrics_port + i``.
+    """
+    # spawn rather than fork: the parent may be a Streamlit server with threads running
+    context = multiprocessing.get_context("spawn")
+    workers = []
+    for i in range(processes):
+        worker = context.Process(
+            target=work,
+            args=(directory, cache_path, cache_max_bytes, scheduler_path, pool_settings, local_whisper,
+                  None if metrics_port is None else metrics_port + i, metrics_log, jobs_per_worker, chunk_workers),
+            daemon=True,
+        )
+        worker.start()
+        workers.append(worker)
+    return workers
+
+
+def add_local_whisper_arguments(parser):
+    """Command-line options that select and configure ``FasterWhisperBackend``."""
+    group = parser.add_argument_group("local transcription")
+    group.add_argument("--local", action="store_true", help="transcribe on this machine with faster-whisper")
+    group.add_argument("--local-model", help="faster-whisper model size or path (default: the profile's model)")
+    group.add_argument("--compute-type", default=LocalWhisperSettings.compute_type)
+    group.add_argument("--threads", type=int, default=LocalWhisperSettings.cpu_threads,
+                       help="CPU threads per transcription (0: automatic)")
+    group.add_argument("--batch-size", type=int, default=LocalWhisperSettings.batch_size,
+                       help="30-second windows decoded together (1: no batching)")
+
+
+def local_whisper_settings(args, num_workers=DEFAULT_MAX_WORKERS):
+    """``LocalWhisperSettings`` from the options of ``add_local_whisper_arguments``, or None without ``--local``."""
+    if not args.local:
+        return None
+    return LocalWhisperSettings(
+        model=args.local_model,
+        compute_type=args.compute_type,
+        cpu_threads=args.threads,
+        num_workers=num_workers,
+        batch_size=args.batch_size,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run background transcription workers.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    worker_parser = subcommands.add_parser("worker", help="claim and run queued jobs")
+    worker_parser.add_argument("--processes", type=int, default=2)
+    worker_parser.add_argument("--jobs-per-worker", type=int, default=DEFAULT_JOBS_PER_WORKER,
+                               help="jobs each worker process runs at the same time")
+    worker_parser.add_argument("--chunk-workers", type=int, default=DEFAULT_MAX_WORKERS,
+                               help="chunks each worker process transcribes at the same time, across its jobs")
+    worker_parser.add_argument("--jobs-dir", default=DEFAULT_JOBS_DIR)
+    worker_parser.add_argument("--cache-path", default=os.environ.get("TRANSCRIPTION_CACHE_PATH", DEFAULT_CACHE_PATH))
+    worker_parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024))
+    worker_parser.add_argument("--rate-limits-path", default=DEFAULT_SCHEDULER_PATH,
+                               help="rate limit state shared with the app's workers and the batch CLI")
+    worker_parser.add_argument("--max-connections", type=int, default=DEFAULT_POOL_SETTINGS.max_connections,
+                               help="HTTP connection pool size per worker process")
+    worker_parser.add_argument("--read-timeout", type=float, default=DEFAULT_POOL_SETTINGS.read_timeout)
+    worker_parser.add_argument("--metrics-port", type=int,
+                               help="serve Prometheus metrics, one port per worker starting at this one")
+    worker_parser.add_argument("--metrics-log", help="append every job's timings and counters to this JSON Lines file")
+    add_local_whisper_arguments(worker_parser)
+    args = parser.parse_args()
+
+    pool_settings = PoolSettings(
+        max_connections=args.max_connections,
+        max_keepalive_connections=args.max_connections,
+        read_timeout=args.read_timeout,
+    )
+    workers = start_workers(
+        args.processes, args.jobs_dir, args.cache_path, args.cache_max_mb * 1024 * 1024, args.rate_limits_path,
+        pool_settings, local_whisper_settings(args, args.chunk_workers), args.metrics_port, args.metrics_log,
+        args.jobs_per_worker, args.chunk_workers,
+    )
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
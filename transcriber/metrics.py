@@ -0,0 +1,182 @@
+"""Spans and counters that show where a transcription spends its time.
+
+A ``Metrics`` registry records how long each stage took (``span``) and
+running totals (``add``): audio seconds processed, bytes uploaded, requests
+made. The engine records every file into a ``Metrics`` of its own whose
+parent is the process-wide ``PROCESS_METRICS``, so a job's figures are stored
+with the job while the process keeps totals across jobs.
+
+Objects that already keep counters, such as the ``RequestScheduler``, the
+``ConnectionMetrics`` or the ``TranscriptionCache``, are attached with
+``add_source`` and read whenever a snapshot is taken. Those totals cover the
+whole process; for a file's own share, the scheduler records the waits and
+retries of every call it is given a ``Metrics`` for, and binds that
+``Metrics`` to the thread (``bind_metrics``) while the request runs so the
+connection counters can add to it as well.
+
+Totals are exported in the Prometheus text format (``to_prometheus``, served
+at ``/metrics`` by ``serve_metrics``), or appended to a JSON Lines file by
+``MetricsLog``, one record per job.
+"""
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROMETHEUS_PREFIX = "transcriber"
+
+_bound = threading.local()
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Metrics:
+    """Thread-safe stage timings and counters, passed on to ``parent`` as well when there is one."""
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self._lock = threading.Lock()
+        self._spans = {}
+        self._counters = {}
+        self._sources = {}
+
+    @contextmanager
+    def span(self, name):
+        """Time the ``with`` block as one run of stage ``name``."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def observe(self, name, seconds):
+        """Record one run of stage ``name`` that took ``seconds``."""
+        with self._lock:
+            span = self._spans.setdefault(name, {"count": 0, "seconds": 0.0, "max_seconds": 0.0})
+            span["count"] += 1
+            span["seconds"] += seconds
+            span["max_seconds"] = max(span["max_seconds"], seconds)
+        if self.parent is not None:
+            self.parent.observe(name, seconds)
+
+    def add(self, name, value=1):
+        """Add ``value`` to counter ``name``."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+        if self.parent is not None:
+            self.parent.add(name, value)
+
+    def add_source(self, name, source):
+        """Include ``source.stats()`` under ``name`` in every snapshot."""
+        with self._lock:
+            self._sources[name] = source
+
+    def snapshot(self):
+        """``spans`` and ``counters`` so far, plus the stats of every source, as a JSON-serialisable dict."""
+        with self._lock:
+            snapshot = {
+                "spans": {name: dict(span) for name, span in self._spans.items()},
+                "counters": dict(self._counters),
+            }
+            sources = dict(self._sources)
+        for name, source in sources.items():
+            snapshot[name] = source.stats()
+        return snapshot
+
+
+# Totals for everything this process has done
+PROCESS_METRICS = Metrics()
+
+
+@contextmanager
+def bind_metrics(metrics):
+    """Make ``metrics`` what ``bound_metrics()`` returns on this thread for the ``with`` block."""
+    previous = getattr(_bound, "metrics", None)
+    _bound.metrics = metrics
+    try:
+        yield
+    finally:
+        _bound.metrics = previous
+
+
+def bound_metrics():
+    """The ``Metrics`` bound to this thread by ``bind_metrics``, or None."""
+    return getattr(_bound, "metrics", None)
+
+
+def audio_seconds_per_second(snapshot):
+    """Seconds of audio processed per wall-clock second of the ``total`` stage, or None."""
+    seconds = snapshot.get("spans", {}).get("total", {}).get("seconds")
+    audio_seconds = snapshot.get("counters", {}).get("audio_seconds")
+    if not seconds or not audio_seconds:
+        return None
+    return audio_seconds / seconds
+
+
+def _metric_name(*parts):
+    return re.sub(r"[^a-zA-Z0-9_]", "_", "_".join(parts))
+
+
+def to_prometheus(snapshot, prefix=PROMETHEUS_PREFIX):
+    """A ``Metrics.snapshot()`` in the Prometheus text exposition format."""
+    lines = []
+    spans = snapshot.get("spans", {})
+    for metric, field, kind, help_text in (
+        ("stage_seconds_total", "seconds", "counter", "Time spent in each stage"),
+        ("stage_runs_total", "count", "counter", "Runs of each stage"),
+        ("stage_max_seconds", "max_seconds", "gauge", "Longest single run of each stage"),
+    ):
+        name = _metric_name(prefix, metric)
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(f'{name}{{stage="{stage}"}} {span[field]}' for stage, span in sorted(spans.items()))
+    for counter, value in sorted(snapshot.get("counters", {}).items()):
+        name = _metric_name(prefix, counter, "total")
+        lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name} {value}")
+    for source, stats in sorted(snapshot.items()):
+        if source in ("spans", "counters"):
+            continue
+        for key, value in sorted(stats.items()):
+            name = _metric_name(prefix, source, key)
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def serve_metrics(port, metrics=PROCESS_METRICS, host="127.0.0.1"):
+    """Serve ``metrics`` at ``http://host:port/metrics`` from a daemon thread; returns the server."""
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = to_prometheus(metrics.snapshot()).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class MetricsLog:
+    """Appends one JSON record per line to the file at ``path``; several processes may share it."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps({"time": time.time(), **record}, ensure_ascii=False, separators=(",", ":")) + "\n"
+        # One write per record, so lines from different processes do not interleave
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
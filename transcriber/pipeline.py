@@ -0,0 +1,163 @@
+"""Transcription and summarization as overlapping pipeline stages.
+
+Summarizing only after the last chunk is transcribed makes the total latency
+transcription time plus LLM time. Here finished chunks are released in chunk
+order and appended to a running transcript; as soon as a full summary piece
+has accumulated it is summarized on a separate pool while later chunks are
+still being transcribed. When the last chunk arrives only the remaining text
+and the final merge are left to do.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from .chunk_dispatch import DEFAULT_MAX_WORKERS, dispatch_chunks, join_transcript
+from .summarize import (
+    CHARS_PER_TOKEN,
+    DEFAULT_MAX_INPUT_TOKENS,
+    DEFAULT_MAX_WORKERS as DEFAULT_SUMMARY_WORKERS,
+    reduce_partials,
+    split_by_tokens,
+    summarize_piece,
+    summarize_transcript,
+)
+
+
+@dataclass
+class PipelineResult:
+    chunk_results: list
+    transcript: str
+    summary: str
+    # Seconds spent per stage; see run_pipeline
+    timings: dict = field(default_factory=dict)
+
+
+class OrderedRelease:
+    """Collects results that finish out of order and releases them in index order."""
+
+    def __init__(self, release):
+        self._release = release
+        self._waiting = {}
+        self._next = 0
+
+    def add(self, result):
+        self._waiting[result.index] = result
+        while self._next in self._waiting:
+            self._release(self._waiting.pop(self._next))
+            self._next += 1
+
+
+class IncrementalSummarizer:
+    """Summarizes a transcript that arrives in order, one piece at a time.
+
+    ``add`` buffers text and submits a map summary for every piece that
+    reaches the token budget; ``finish`` summarizes what is left and merges
+    all partial summaries.
+    """
+
+    def __init__(self, client, language, model, max_input_tokens=DEFAULT_MAX_INPUT_TOKENS,
+                 max_workers=DEFAULT_SUMMARY_WORKERS, temperature=0.5, max_tokens=2048):
+        self.client = client
+        self.language = language
+        self.model = model
+        self.max_input_tokens = max_input_tokens
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.map_seconds = 0.0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._partials = []
+        self._buffer = []
+
+    def _summarize_piece(self, piece):
+        started = time.perf_counter()
+        try:
+            return summarize_piece(self.client, piece, self.language, self.model, self.temperature, self.max_tokens)
+        finally:
+            with self._lock:
+                self.map_seconds += time.perf_counter() - started
+
+    def add(self, text):
+        if not text:
+            return
+        self._buffer.append(text)
+        # Hand every full piece to the pool and keep the remainder buffered
+        if sum(len(t) + 1 for t in self._buffer) > self.max_input_tokens * CHARS_PER_TOKEN:
+            pieces = split_by_tokens("\n".join(self._buffer), self.max_input_tokens)
+            for piece in pieces[:-1]:
+                self._partials.append(self._pool.submit(self._summarize_piece, piece))
+            self._buffer = pieces[-1:]
+
+    def finish(self, on_token=None):
+        try:
+            remainder = "\n".join(self._buffer)
+            if not self._partials:
+                # Short transcript: one ordinary summary request
+                return summarize_transcript(self.client, remainder, self.language, self.model,
+                                            self.max_input_tokens, temperature=self.temperature,
+                                            max_tokens=self.max_tokens, on_token=on_token)
+            for piece in split_by_tokens(remainder, self.max_input_tokens):
+                self._partials.append(self._pool.submit(self._summarize_piece, piece))
+            partials = [future.result() for future in self._partials]
+            return reduce_partials(self.client, partials, self.language, self.model, self._pool,
+                                   self.max_input_tokens, self.temperature, self.max_tokens, on_token)
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop the summary pool, dropping summaries that have not started."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run_pipeline(chunks, transcribe_chunk, summary_client, language, summary_model,
+                 max_workers=DEFAULT_MAX_WORKERS, on_result=None, on_transcript=None, on_token=None,
+                 max_input_tokens=DEFAULT_MAX_INPUT_TOKENS, pool=None):
+    """Transcribe ``chunks`` and summarize the transcript while the chunks are still coming in.
+
+    ``chunks``, ``transcribe_chunk``, ``max_workers``, ``on_result`` and ``pool`` are as for
+    ``dispatch_chunks``. ``on_transcript(result)`` is called with the chunk
+    results in chunk order, as soon as every earlier chunk has finished, and
+    ``on_token`` receives the final summary as it is streamed. Both are called
+    from the calling thread. The returned timings are: ``transcription`` (start until
+    the last chunk finished), ``summary_map`` (time spent in summaries of
+    pieces, mostly overlapping transcription), ``summary_after_transcription``
+    (what summarizing added after the last chunk) and ``total``.
+    """
+    started = time.perf_counter()
+    summarizer = IncrementalSummarizer(summary_client, language, summary_model, max_input_tokens)
+
+    def release(result):
+        summarizer.add(result.text if result.ok else "")
+        if on_transcript is not None:
+            on_transcript(result)
+
+    ordered = OrderedRelease(release)
+
+    def on_chunk_done(result):
+        ordered.add(result)
+        if on_result is not None:
+            on_result(result)
+
+    try:
+        chunk_results = dispatch_chunks(
+            chunks, transcribe_chunk, max_workers=max_workers, on_result=on_chunk_done, pool=pool,
+        )
+        transcribed = time.perf_counter()
+        if not any(result.ok for result in chunk_results):
+            # Usually every chunk failed for the same reason (a bad key, a file the API rejects); show it
+            error = chunk_results[0].error if chunk_results else None
+            raise RuntimeError(f"none of the chunks could be transcribed: {error}") from error
+        summary = summarizer.finish(on_token)
+    except BaseException:
+        summarizer.close()
+        raise
+    finished = time.perf_counter()
+
+    timings = {
+        "transcription": transcribed - started,
+        "summary_map": summarizer.map_seconds,
+        "summary_after_transcription": finished - transcribed,
+        "total": finished - started,
+    }
+    return PipelineResult(chunk_results, join_transcript(chunk_results), summary, timings)
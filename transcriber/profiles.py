@@ -0,0 +1,33 @@
+"""Model profiles: which models a page or command runs with, and whether it translates.
+
+The app used to be four copies of the same script that differed only in
+these names. Each entry point now picks a profile and shares everything else.
+"""
+from dataclasses import dataclass
+
+# What the speech-to-text model is asked to do
+TRANSCRIBE = "transcribe"
+# Translate any spoken language into English text
+TRANSLATE = "translate"
+
+
+@dataclass(frozen=True)
+class ModelProfile:
+    name: str
+    transcription_model: str
+    summary_model: str
+    task: str = TRANSCRIBE
+    title: str = "Audio Transcription"
+
+
+# Fastest transcription with the current summary model (transcribe_st.py)
+TURBO = ModelProfile("turbo", "whisper-large-v3-turbo", "llama-3.3-70b-versatile")
+# Full-size Whisper (transcribe_st2.py, transcribe_st3.py)
+LARGE_V3 = ModelProfile("large-v3", "whisper-large-v3", "llama-3.2-90b-vision-preview")
+# Translation to English ("transcribe_st copy.py")
+TRANSLATE_TO_ENGLISH = ModelProfile(
+    "translate", "whisper-large-v3", "llama-3.2-90b-vision-preview", task=TRANSLATE, title="Audio Translation",
+)
+
+PROFILES = {profile.name: profile for profile in (TURBO, LARGE_V3, TRANSLATE_TO_ENGLISH)}
+DEFAULT_PROFILE = TURBO
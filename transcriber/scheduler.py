@@ -0,0 +1,241 @@
+"""Client-side rate limiting and retries for API calls, shared by every process.
+
+All sessions and workers share one API key, so the limits have to be
+enforced across processes. ``RequestScheduler`` keeps token buckets in a
+small SQLite database: one per model for requests per minute and, for speech
+models, one for audio seconds per hour. A call first reserves its share of
+every bucket and sleeps until the reservation is due, so callers queue up in
+order instead of all hitting the API and being turned away.
+
+Rate-limit (429), timeout and server errors are retried with jittered
+exponential backoff. When the response says how long to wait (``retry-after``
+or ``retry-after-ms``) that wait is used instead, and it pauses the model
+for every process, not only the caller. Time spent waiting for the buckets
+and in backoff is counted, so callers can report queueing delay; a call
+given a ``Metrics`` also adds its own share to it.
+"""
+import email.utils
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from types import SimpleNamespace
+
+import groq
+import httpx
+
+from .metrics import bind_metrics
+
+DEFAULT_SCHEDULER_PATH = ".cache/rate_limits.sqlite3"
+
+DEFAULT_MAX_RETRIES = 6
+# Backoff before retry n is up to BASE_DELAY_SECONDS * 2**n, capped at MAX_DELAY_SECONDS
+BASE_DELAY_SECONDS = 1.0
+MAX_DELAY_SECONDS = 60.0
+# HTTP statuses worth retrying besides 5xx
+RETRY_STATUSES = {408, 409, 429}
+# The API bills every transcription request as at least this much audio
+MIN_BILLED_AUDIO_SECONDS = 10
+
+
+@dataclass(frozen=True)
+class RateLimits:
+    requests_per_minute: int | None = None
+    audio_seconds_per_hour: int | None = None
+
+
+# Limits of the free tier; models not listed here only get DEFAULT_LIMITS
+MODEL_LIMITS = {
+    "whisper-large-v3": RateLimits(20, 7200),
+    "whisper-large-v3-turbo": RateLimits(20, 7200),
+    "llama-3.3-70b-versatile": RateLimits(30),
+    "llama-3.2-90b-vision-preview": RateLimits(15),
+}
+DEFAULT_LIMITS = RateLimits(30)
+
+
+def is_retryable(error):
+    """Whether a failed call may succeed if it is made again."""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRY_STATUSES or status >= 500
+    return isinstance(error, (groq.APIConnectionError, httpx.TransportError))
+
+
+def retry_after_seconds(error):
+    """The wait the server asked for in a ``retry-after(-ms)`` header, or None."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            # An HTTP date rather than a number of seconds
+            return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RequestScheduler:
+    """Token buckets and retries for API calls, shared through the database at ``path``."""
+
+    def __init__(self, path=DEFAULT_SCHEDULER_PATH, limits=None, default_limits=DEFAULT_LIMITS,
+                 max_retries=DEFAULT_MAX_RETRIES, base_delay=BASE_DELAY_SECONDS, max_delay=MAX_DELAY_SECONDS):
+        self.path = path
+        self.limits = dict(MODEL_LIMITS if limits is None else limits)
+        self.default_limits = default_limits
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "retries": 0, "rate_limited": 0, "queued_seconds": 0.0}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                " name TEXT PRIMARY KEY,"
+                " tokens REAL NOT NULL,"
+                " updated REAL NOT NULL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS pauses (model TEXT PRIMARY KEY, until REAL NOT NULL)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return closing(conn)
+
+    def _limits_for(self, model):
+        return self.limits.get(model, self.default_limits)
+
+    def _reserve(self, conn, name, amount, capacity, per_second):
+        # Refill since the last reservation, then take ``amount`` even if that
+        # goes negative: the caller waits until the bucket is back at zero
+        row = conn.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+        now = time.time()
+        tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * per_second)
+        tokens -= amount
+        conn.execute("INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)", (name, tokens, now))
+        return max(-tokens / per_second, 0.0)
+
+    def reserve(self, model, audio_seconds=0):
+        """Take one request (and ``audio_seconds``) from ``model``'s budgets; return the seconds to wait."""
+        limits = self._limits_for(model)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                wait = 0.0
+                row = conn.execute("SELECT until FROM pauses WHERE model = ?", (model,)).fetchone()
+                if row is not None:
+                    wait = max(row[0] - time.time(), 0.0)
+                if limits.requests_per_minute:
+                    rpm = limits.requests_per_minute
+                    wait = max(wait, self._reserve(conn, f"requests:{model}", 1, rpm, rpm / 60))
+                if limits.audio_seconds_per_hour and audio_seconds:
+                    ash = limits.audio_seconds_per_hour
+                    billed = max(audio_seconds, MIN_BILLED_AUDIO_SECONDS)
+                    wait = max(wait, self._reserve(conn, f"audio:{model}", billed, ash, ash / 3600))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return wait
+
+    def pause(self, model, seconds):
+        """Hold back every process's calls to ``model`` for ``seconds``."""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO pauses (model, until) VALUES (?, ?)"
+                " ON CONFLICT (model) DO UPDATE SET until = MAX(until, excluded.until)",
+                (model, time.time() + seconds),
+            )
+
+    def backoff_seconds(self, attempt, error):
+        """How long to wait before retry ``attempt`` (0-based) after ``error``."""
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            # A little jitter keeps the waiting callers from all retrying at the same instant
+            return retry_after + random.uniform(0, min(self.base_delay, retry_after / 10 + 0.1))
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, request, model, audio_seconds=0, metrics=None):
+        """Run ``request()`` within ``model``'s budgets, retrying transient failures.
+
+        ``request`` must be safe to call again; rewind any file it uploads.
+        With ``metrics`` the time this call waited, its retries and 429s are
+        added to it too, and it is bound to the thread while ``request`` runs.
+        """
+        queued = 0.0
+        attempt = 0
+        try:
+            while True:
+                # The audio is only charged once; every attempt counts as a request
+                wait = self.reserve(model, audio_seconds if attempt == 0 else 0)
+                if wait:
+                    time.sleep(wait)
+                    queued += wait
+                try:
+                    with bind_metrics(metrics):
+                        return request()
+                except Exception as e:
+                    if attempt >= self.max_retries or not is_retryable(e):
+                        raise
+                    delay = self.backoff_seconds(attempt, e)
+                    rate_limited = getattr(e, "status_code", None) == 429
+                    with self._lock:
+                        self._stats["retries"] += 1
+                        if rate_limited:
+                            self._stats["rate_limited"] += 1
+                    if metrics is not None:
+                        metrics.add("retried_requests")
+                        if rate_limited:
+                            metrics.add("rate_limited_requests")
+                    if retry_after_seconds(e) is not None:
+                        self.pause(model, delay)
+                    time.sleep(delay)
+                    queued += delay
+                    attempt += 1
+        finally:
+            with self._lock:
+                self._stats["requests"] += 1
+                self._stats["queued_seconds"] += queued
+            if metrics is not None and queued:
+                metrics.add("rate_limit_wait_seconds", queued)
+
+    def stats(self):
+        """Running totals for this process: calls, retries, 429s and time spent waiting."""
+        with self._lock:
+            return dict(self._stats)
+
+
+class ScheduledChatClient:
+    """A chat client whose ``chat.completions.create`` calls go through a ``RequestScheduler``.
+
+    Only the request itself is retried; a streamed response that fails
+    halfway is not started again. ``with_metrics`` gives a client for the
+    same connection whose calls also count towards a ``Metrics``.
+    """
+
+    def __init__(self, client, scheduler, metrics=None):
+        self._client = client
+        self._scheduler = scheduler
+
+        def create(**kwargs):
+            return scheduler.call(lambda: client.chat.completions.create(**kwargs), kwargs["model"], metrics=metrics)
+
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=create))
+
+    def with_metrics(self, metrics):
+        return ScheduledChatClient(self._client, self._scheduler, metrics)
@@ -0,0 +1,173 @@
+"""Map-reduce summarization for long transcripts.
+
+A long meeting does not fit in one chat completion, and even when it does a
+single huge request is slow. The transcript is split into pieces that fit a
+token budget, every piece is summarized in parallel (map), and the partial
+summaries and to-do lists are merged (reduce), repeating the merge step in
+groups until everything fits in one final request. Splitting and merging are
+purely positional, so the same transcript always produces the same requests.
+"""
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+# Rough characters-per-token ratio for the Llama tokenizer on prose
+CHARS_PER_TOKEN = 4
+# Transcript tokens sent in one request
+DEFAULT_MAX_INPUT_TOKENS = 8000
+# Summaries produced concurrently during the map and reduce steps
+DEFAULT_MAX_WORKERS = 4
+
+SUMMARY_PROMPT = "You are a helpful assistant. Summarize the following text and generate a to-do list in {language}:"
+MAP_PROMPT = (
+    "You are a helpful assistant. The following text is one part of a longer transcript. "
+    "Summarize this part and list any to-do items it mentions, in {language}:"
+)
+REDUCE_PROMPT = (
+    "You are a helpful assistant. The following are summaries and to-do lists of consecutive parts "
+    "of one transcript, in order. Merge them into a single summary and a single to-do list without "
+    "duplicates, in {language}:"
+)
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text):
+    """Cheap token estimate; good enough for budgeting requests."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _units(text, max_chars):
+    """Break ``text`` into lines, sentences and, as a last resort, word runs of at most ``max_chars``."""
+    for line in text.splitlines():
+        if len(line) <= max_chars:
+            yield line
+            continue
+        for sentence in _SENTENCE_END.split(line):
+            if len(sentence) <= max_chars:
+                yield sentence
+                continue
+            words = []
+            size = 0
+            for word in sentence.split():
+                if words and size + len(word) + 1 > max_chars:
+                    yield " ".join(words)
+                    words, size = [], 0
+                words.append(word)
+                size += len(word) + 1
+            if words:
+                yield " ".join(words)
+
+
+def split_by_tokens(text, max_tokens=DEFAULT_MAX_INPUT_TOKENS):
+    """Split ``text`` into consecutive pieces of at most ``max_tokens`` (estimated) each."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    pieces = []
+    current = []
+    size = 0
+    for unit in _units(text, max_chars):
+        if current and size + len(unit) + 1 > max_chars:
+            pieces.append("\n".join(current))
+            current, size = [], 0
+        current.append(unit)
+        size += len(unit) + 1
+    if current:
+        pieces.append("\n".join(current))
+    return [piece for piece in pieces if piece.strip()]
+
+
+def _complete(client, model, system_prompt, text, temperature, max_tokens, on_token=None):
+    """One chat completion; with ``on_token`` the reply is streamed and passed on piece by piece."""
+    chat_completion = client.chat.completions.create(
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": text}
+        ],
+        model=model,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        top_p=1,
+        stop=None,
+        stream=on_token is not None,
+    )
+    if on_token is None:
+        return chat_completion.choices[0].message.content
+
+    parts = []
+    for chunk in chat_completion:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            parts.append(delta)
+            on_token(delta)
+    return "".join(parts)
+
+
+def _join_partials(partials):
+    return "\n\n".join(f"Part {i+1}:\n{partial}" for i, partial in enumerate(partials))
+
+
+def _group_by_tokens(partials, max_tokens):
+    """Pack consecutive partial summaries into groups that fit ``max_tokens``."""
+    groups = []
+    current = []
+    for partial in partials:
+        if current and estimate_tokens(_join_partials(current + [partial])) > max_tokens:
+            groups.append(current)
+            current = []
+        current.append(partial)
+    if current:
+        groups.append(current)
+    return groups
+
+
+def summarize_piece(client, piece, language, model, temperature=0.5, max_tokens=2048):
+    """Map step: summary and to-do list for one piece of a longer transcript."""
+    return _complete(client, model, MAP_PROMPT.format(language=language), piece, temperature, max_tokens)
+
+
+def reduce_partials(client, partials, language, model, pool, max_input_tokens=DEFAULT_MAX_INPUT_TOKENS,
+                    temperature=0.5, max_tokens=2048, on_token=None):
+    """Reduce step: merge ordered partial summaries into one, in groups while they don't fit.
+
+    Only the final merge is streamed to ``on_token``.
+    """
+    system_prompt = REDUCE_PROMPT.format(language=language)
+
+    def merge(text, on_token=None):
+        return _complete(client, model, system_prompt, text, temperature, max_tokens, on_token)
+
+    partials = list(partials)
+    while len(partials) > 1 and estimate_tokens(_join_partials(partials)) > max_input_tokens:
+        groups = _group_by_tokens(partials, max_input_tokens)
+        if len(groups) == len(partials):
+            # Every partial is already at the budget; merging pairs is the only way forward
+            groups = [partials[i:i + 2] for i in range(0, len(partials), 2)]
+        partials = list(pool.map(merge, [_join_partials(group) for group in groups]))
+
+    if len(partials) == 1:
+        if on_token is not None:
+            on_token(partials[0])
+        return partials[0]
+    return merge(_join_partials(partials), on_token)
+
+
+def summarize_transcript(client, text, language, model, max_input_tokens=DEFAULT_MAX_INPUT_TOKENS,
+                         max_workers=DEFAULT_MAX_WORKERS, temperature=0.5, max_tokens=2048, on_token=None):
+    """Summary and to-do list for ``text``, map-reducing over pieces when it is too long.
+
+    ``client`` is anything with a Groq-style ``chat.completions.create``. When
+    ``on_token`` is given the last request is streamed and its text passed to
+    ``on_token`` as it arrives.
+    """
+    pieces = split_by_tokens(text, max_input_tokens)
+    if len(pieces) <= 1:
+        return _complete(client, model, SUMMARY_PROMPT.format(language=language), text, temperature, max_tokens,
+                         on_token)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        # Map: summarize every piece; pool.map keeps the pieces in order
+        partials = list(pool.map(
+            lambda piece: summarize_piece(client, piece, language, model, temperature, max_tokens),
+            pieces,
+        ))
+        return reduce_partials(client, partials, language, model, pool, max_input_tokens, temperature, max_tokens,
+                               on_token)
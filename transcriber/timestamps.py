@@ -0,0 +1,116 @@
+"""Segment and word timestamps, stored as JSON Lines and exported as subtitles.
+
+With ``verbose_json`` the API splits a transcription into segments with start
+and end times, and with word granularity also times every word. The times
+are relative to the audio that was sent, so the engine shifts a chunk's
+segments by where the chunk starts and, when non-speech was removed, maps
+them back to the original recording through the ``SpeechMap``.
+
+Segments are kept as JSON Lines, one compact object per segment;
+``to_srt`` and ``to_vtt`` turn them into subtitles.
+"""
+import bisect
+import json
+from dataclasses import dataclass
+
+
+@dataclass
+class Segment:
+    start_ms: int
+    end_ms: int
+    text: str
+    # [start_ms, end_ms, word] per word, when word timestamps were asked for
+    words: list | None = None
+
+    def shifted(self, offset_ms):
+        """This segment ``offset_ms`` later, e.g. moved from a chunk's time into the whole file's."""
+        return Segment(
+            self.start_ms + offset_ms,
+            self.end_ms + offset_ms,
+            self.text,
+            None if self.words is None else [[start + offset_ms, end + offset_ms, word]
+                                             for start, end, word in self.words],
+        )
+
+    def to_original(self, speech_map):
+        """This segment in the original recording's time, given the ``SpeechMap`` of a speech-only file."""
+        start_ms, end_ms = speech_map.span_to_original((self.start_ms, self.end_ms))
+        words = None
+        if self.words is not None:
+            words = [[*speech_map.span_to_original((start, end)), word] for start, end, word in self.words]
+        return Segment(start_ms, end_ms, self.text, words)
+
+    def as_dict(self):
+        segment = {"start_ms": self.start_ms, "end_ms": self.end_ms, "text": self.text}
+        if self.words is not None:
+            segment["words"] = self.words
+        return segment
+
+    @classmethod
+    def from_dict(cls, segment):
+        return cls(segment["start_ms"], segment["end_ms"], segment["text"], segment.get("words"))
+
+
+def _field(item, name):
+    # The SDK hands back the verbose fields as plain dicts; other clients may use objects
+    return item[name] if isinstance(item, dict) else getattr(item, name)
+
+
+def segments_from_response(response, with_words=False):
+    """``Segment``s of a ``verbose_json`` transcription response; empty if it has none.
+
+    The API lists words separately from segments, so each word is given to
+    the segment it starts in.
+    """
+    segments = [
+        Segment(
+            round(_field(item, "start") * 1000),
+            round(_field(item, "end") * 1000),
+            _field(item, "text").strip(),
+            [] if with_words else None,
+        )
+        for item in getattr(response, "segments", None) or []
+    ]
+    if with_words and segments:
+        starts = [segment.start_ms for segment in segments]
+        for item in getattr(response, "words", None) or []:
+            start_ms, end_ms = round(_field(item, "start") * 1000), round(_field(item, "end") * 1000)
+            i = max(bisect.bisect_right(starts, start_ms) - 1, 0)
+            segments[i].words.append([start_ms, end_ms, _field(item, "word").strip()])
+    return segments
+
+
+def to_jsonl(segments):
+    """The segments as JSON Lines, one per line."""
+    return "".join(
+        json.dumps(segment.as_dict(), ensure_ascii=False, separators=(",", ":")) + "\n" for segment in segments
+    )
+
+
+def parse_jsonl(text):
+    """The segments in a ``to_jsonl`` string."""
+    return [Segment.from_dict(json.loads(line)) for line in text.splitlines() if line.strip()]
+
+
+def _subtitle_time(ms, separator):
+    hours, rest = divmod(max(int(ms), 0), 3_600_000)
+    minutes, rest = divmod(rest, 60_000)
+    seconds, millis = divmod(rest, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{millis:03d}"
+
+
+def to_srt(segments):
+    """The segments as SubRip (``.srt``) subtitles."""
+    return "\n".join(
+        f"{i}\n{_subtitle_time(segment.start_ms, ',')} --> {_subtitle_time(segment.end_ms, ',')}\n{segment.text}\n"
+        for i, segment in enumerate(segments, start=1)
+    )
+
+
+def to_vtt(segments):
+    """The segments as WebVTT (``.vtt``) subtitles."""
+    cues = [
+        f"{_subtitle_time(segment.start_ms, '.')} --> {_subtitle_time(segment.end_ms, '.')}\n{segment.text}\n"
+        for segment in segments
+    ]
+    return "\n".join(["WEBVTT\n", *cues])
@@ -0,0 +1,127 @@
+"""Energy-based voice activity detection ahead of chunking.
+
+Long pauses, hold music and dead air before and after a meeting are still
+chunked, uploaded and billed. ``speech_regions`` finds the stretches of a
+recording that are loud enough to be speech, using the same loudness
+envelope as the chunk planner and a threshold that adapts to the
+recording's noise floor; ``extract_speech`` then writes only those regions
+to a new file, which is what gets chunked and transcribed.
+
+A ``SpeechMap`` records where each kept region came from, so a time in the
+speech-only audio (a chunk boundary, or a segment timestamp) can be mapped
+back to the same moment in the original recording.
+
+This is deliberately simple: loud music counts as speech. It is meant to
+remove silence and background noise, not to classify audio.
+"""
+import bisect
+from dataclasses import dataclass
+
+import numpy as np
+
+from .chunk_plan import FRAME_MS, SILENCE_DB, iter_energy_db
+
+# Speech must be this much louder than the recording's noise floor...
+NOISE_MARGIN_DB = 12.0
+# ...but anything louder than this is always speech, however noisy the recording
+MAX_THRESHOLD_DB = -30.0
+# Share of frames assumed to be background when estimating the noise floor
+NOISE_PERCENTILE = 10
+# Pauses shorter than this are kept, so sentences are not cut apart
+MIN_SILENCE_MS = 1000
+# Loud blips shorter than this (clicks, a door) are dropped
+MIN_SPEECH_MS = 200
+# Audio kept on either side of every speech region
+SPEECH_PAD_MS = 300
+
+
+def _runs(mask):
+    """(start, end) index pairs of the runs of True in ``mask``."""
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], mask.astype(np.int8), [0]])))
+    return list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+
+def speech_regions(energy_db, frame_ms=FRAME_MS, min_silence_ms=MIN_SILENCE_MS, min_speech_ms=MIN_SPEECH_MS,
+                   pad_ms=SPEECH_PAD_MS):
+    """(start_ms, end_ms) regions of speech in a loudness envelope, sorted and non-overlapping.
+
+    ``energy_db`` holds per-frame loudness for the whole recording, as
+    produced (block by block) by ``iter_energy_db``.
+    """
+    energy_db = np.asarray(energy_db)
+    if len(energy_db) == 0:
+        return []
+    noise_floor = float(np.percentile(energy_db, NOISE_PERCENTILE))
+    threshold = min(max(SILENCE_DB, noise_floor + NOISE_MARGIN_DB), MAX_THRESHOLD_DB)
+
+    speech = energy_db > threshold
+    # Fill short pauses first, then drop what is still too short to be speech
+    min_silence = max(min_silence_ms // frame_ms, 1)
+    for start, end in _runs(~speech):
+        if end - start < min_silence and start > 0 and end < len(speech):
+            speech[start:end] = True
+    min_speech = max(min_speech_ms // frame_ms, 1)
+    pad = pad_ms // frame_ms
+
+    regions = []
+    for start, end in _runs(speech):
+        if end - start < min_speech:
+            continue
+        start, end = max(start - pad, 0), min(end + pad, len(speech))
+        if regions and start <= regions[-1][1]:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+    return [(start * frame_ms, end * frame_ms) for start, end in regions]
+
+
+def detect_speech(path):
+    """Run voice activity detection over the file at ``path`` and return its ``SpeechMap``."""
+    blocks = list(iter_energy_db(path))
+    energy_db = np.concatenate(blocks) if blocks else np.empty(0, dtype=np.float32)
+    return SpeechMap(speech_regions(energy_db), len(energy_db) * FRAME_MS)
+
+
+@dataclass
+class SpeechMap:
+    """Where each region of a speech-only file came from in the original recording."""
+    # (start_ms, end_ms) in the original, in order
+    regions: list
+    duration_ms: int
+
+    @property
+    def speech_ms(self):
+        return sum(end - start for start, end in self.regions)
+
+    @property
+    def removed_ms(self):
+        return max(self.duration_ms - self.speech_ms, 0)
+
+    def to_original(self, ms):
+        """The time in the original recording of ``ms`` into the speech-only audio."""
+        if not self.regions:
+            return ms
+        starts = self._speech_starts()
+        i = max(bisect.bisect_right(starts, ms) - 1, 0)
+        return self.regions[i][0] + ms - starts[i]
+
+    def span_to_original(self, span):
+        """Map a (start_ms, end_ms) span of the speech-only audio back to the original."""
+        start_ms, end_ms = span
+        # The end is mapped from just inside the span, so a span ending on a region boundary
+        # ends where that region does rather than where the next one starts
+        return self.to_original(start_ms), self.to_original(max(end_ms - 1, start_ms)) + 1
+
+    def _speech_starts(self):
+        starts, total = [], 0
+        for start, end in self.regions:
+            starts.append(total)
+            total += end - start
+        return starts
+
+    def as_list(self):
+        """The regions as [speech_start_ms, original_start_ms, duration_ms] triples, for JSON."""
+        return [
+            [speech_start, start, end - start]
+            for speech_start, (start, end) in zip(self._speech_starts(), self.regions)
+        ]